@@ -12,7 +12,8 @@ from string import Template
 import sys
 
 import boto3
-from botocore.exceptions import ClientError
+
+from radiorumblenyc import s3
 
 
 logger = logging.getLogger(__name__)
@@ -359,33 +360,14 @@ class FeedBuilder:
     def _local_audio_filepath_to_s3_key(cls, local_filepath):
         logger.info("local_filepath %s", local_filepath)
 
-    @classmethod
-    def _local_image_filepath_to_s3_key(cls, local_filepath):
-        logger.info("local_filepath %s", local_filepath)
-        return local_filepath.replace("./", "")
-
     def _sync_audio_directory(self):
         for dir_name, _dirs, files in os.walk("./audio"):
             for filename in files:
                 local_filepath = f"{dir_name}/{filename}"
                 s3_key = self._local_audio_filepath_to_s3_key(local_filepath)
 
-    def _sync_image(self, filepath):
-        s3_key = self._local_image_filepath_to_s3_key(filepath)
-        obj = self._s3.Object(self._bucket_name, s3_key)
-
-        try:
-            _ = obj.checksum_sha1
-        except ClientError:
-            logger.info("object %s does not exist in s3", s3_key)
-            obj.upload_file(filepath)
-            logger.info("upload_file complete %s", s3_key)
-
     def _sync_images_directory(self):
-        for dir_name, _dirs, files in os.walk("./images"):
-            for filename in files:
-                local_filepath = f"{dir_name}/{filename}"
-                self._sync_image(local_filepath)
+        s3.sync_images(self._bucket_name, "./images", "images/")
 
     @classmethod
     def _filename_to_content_type(cls, filename):
@@ -1,29 +1,132 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
 import logging
 import sys
 
-from radiorumblenyc import s3
-import radiorumblenyc.jsonfeed as jsonfeed
-import radiorumblenyc.rssfeed as rssfeed
-import radiorumblenyc.htmlgenerator as htmlgenerator
+from radiorumblenyc import analytics
+from radiorumblenyc import devmode
+from radiorumblenyc import pipeline
+from radiorumblenyc import server
+from radiorumblenyc import shows
 
 logger = logging.getLogger(__name__)
 
 
-def main():
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="build the radio.rumble.nyc feeds")
+    parser.set_defaults(
+        command="build",
+        publish=False,
+        current_year_only=False,
+        full=False,
+        check_incremental=False,
+        write=True,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    build = subparsers.add_parser("build", help="build every show (the default)")
+    build.add_argument(
+        "--publish",
+        action="store_true",
+        help="upload assets, HTML and feeds to the bucket after building",
+    )
+    build.add_argument(
+        "--current-year-only",
+        action="store_true",
+        help="relist only the current year, reusing past years from the last listing",
+    )
+    build.add_argument(
+        "--full",
+        action="store_true",
+        help="re-render every episode instead of only the added and changed ones",
+    )
+    build.add_argument(
+        "--check-incremental",
+        action="store_true",
+        help="fail unless the incremental output matches a full rebuild byte for byte",
+    )
+    build.add_argument(
+        "--no-write",
+        dest="write",
+        action="store_false",
+        help="don't write feeds and pages to disk (--publish uploads them from memory)",
+    )
+
+    plays = subparsers.add_parser(
+        "analytics", help="count episode plays from access logs"
+    )
+    plays.add_argument("logs", nargs="+", help="plain or .gz access log files")
+    plays.add_argument("--output", default=analytics.PLAYS_PATH)
+
+    serve = subparsers.add_parser(
+        "serve", help="build, then serve the feeds and pages from memory"
+    )
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument(
+        "--rebuild-interval",
+        type=int,
+        help="seconds between rebuilds (send SIGHUP to rebuild at any time)",
+    )
+
+    dev = subparsers.add_parser(
+        "dev",
+        help="rebuild just the affected outputs as templates, images and ./audio change",
+    )
+    dev.add_argument(
+        "--poll", action="store_true", help="poll for changes instead of using inotify"
+    )
+    return parser.parse_args(argv)
+
+
+def build(args):
+    """build every show, optionally publishing them"""
+    config = shows.load_config()
+    builds = pipeline.build_all(
+        config, args.current_year_only, args.full, args.check_incremental, args.write
+    )
+    if args.publish:
+        pipeline.publish_all(config, builds)
+
+
+def count_plays(args):
+    """aggregate access logs into the counters the "most played" list uses"""
+    episodes = analytics.count_plays(args.logs, shows.load_config()["shows"])
+    analytics.write_plays(episodes, args.output)
+    logger.info("counted plays for %d episodes", len(episodes))
+
+
+def serve(args):
+    """serve the built site from memory, swapping in rebuilds as they finish"""
+    config = shows.load_config()
+
+    def rebuild():
+        return server.build_site(pipeline.build_all(config))
+
+    asyncio.run(
+        server.serve(rebuild(), rebuild, args.host, args.port, args.rebuild_interval)
+    )
+
+
+def dev(args):
+    """watch local files and rebuild from the last bucket listing, without S3"""
+    devmode.run(shows.load_config(), args.poll)
+
+
+def main(argv=None):
     """kick it all off"""
+    args = _parse_args(argv)
     logging.basicConfig(stream=sys.stdout, level="INFO")
     logger.info("starting main...")
-    bucket_name = "rumble-nyc-radio"
-
-    audio_paths = s3.get_audio_from_s3(bucket_name)
-    json_feed = jsonfeed.build_feed(audio_paths=audio_paths)
-    xml_feed = rssfeed.json_feed_to_rss_xml(json_feed)
-    html = htmlgenerator.json_feed_to_html(json_feed)
-
-    jsonfeed.write_feed(json_feed)
-    rssfeed.write_feed(xml_feed)
-    htmlgenerator.write_html(html)
+    if args.command == "analytics":
+        count_plays(args)
+    elif args.command == "serve":
+        serve(args)
+    elif args.command == "dev":
+        dev(args)
+    else:
+        build(args)
 
 
 if __name__ == "__main__":
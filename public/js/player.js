@@ -0,0 +1,46 @@
+(function () {
+  // attach a real player to an episode card only when it is needed, so the
+  // page makes no audio requests until a card is played or scrolled into view
+  function hydrate(card) {
+    if (card.querySelector("audio")) {
+      return card.querySelector("audio");
+    }
+    var audio = document.createElement("audio");
+    audio.controls = true;
+    audio.preload = "none";
+    var source = document.createElement("source");
+    source.src = card.getAttribute("data-src");
+    source.type = card.getAttribute("data-type");
+    audio.appendChild(source);
+    var button = card.querySelector(".episode-play");
+    card.replaceChild(audio, button);
+    return audio;
+  }
+
+  document.addEventListener("click", function (evt) {
+    if (!evt.target.classList.contains("episode-play")) {
+      return;
+    }
+    var card = evt.target.closest(".episode-card");
+    hydrate(card).play();
+  });
+
+  var cards = document.querySelectorAll(".episode-card[data-src]");
+  if (!("IntersectionObserver" in window)) {
+    return;
+  }
+  var observer = new IntersectionObserver(
+    function (entries) {
+      entries.forEach(function (entry) {
+        if (entry.isIntersecting && entry.target.querySelector(".episode-play")) {
+          hydrate(entry.target);
+          observer.unobserve(entry.target);
+        }
+      });
+    },
+    { rootMargin: "200px" }
+  );
+  cards.forEach(function (card) {
+    observer.observe(card);
+  });
+})();
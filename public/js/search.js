@@ -0,0 +1,80 @@
+(function () {
+  var input = document.querySelector("#episodeSearch");
+  var status = document.querySelector("#episodeSearchStatus");
+  if (!input) {
+    return;
+  }
+  var baseUrl = input.getAttribute("data-index");
+  var manifest = null;
+  var shards = {};
+
+  function fetchJson(path) {
+    return fetch(baseUrl + path).then(function (response) {
+      return response.json();
+    });
+  }
+
+  function tokenize(query) {
+    return query.toLowerCase().match(/[a-z0-9]+/g) || [];
+  }
+
+  function loadShard(token) {
+    var key = manifest.sharded ? token[0] : "_";
+    var filename = manifest.shards[key];
+    if (!filename) {
+      return Promise.resolve({});
+    }
+    if (!shards[key]) {
+      shards[key] = fetchJson(filename);
+    }
+    return shards[key];
+  }
+
+  function intersect(a, b) {
+    var seen = new Set(b);
+    return a.filter(function (doc) {
+      return seen.has(doc);
+    });
+  }
+
+  function show(matches) {
+    var cards = document.querySelectorAll(".json-feed-item");
+    cards.forEach(function (card) {
+      card.style.display = !matches || matches.has(card.id) ? "" : "none";
+    });
+    status.innerText = matches ? matches.size + " episodes" : "";
+  }
+
+  async function search(query) {
+    var tokens = tokenize(query);
+    if (!tokens.length) {
+      show(null);
+      return;
+    }
+    if (!manifest) {
+      manifest = await fetchJson("index.json");
+    }
+    var postings = await Promise.all(
+      tokens.map(function (token) {
+        return loadShard(token).then(function (shard) {
+          return shard[token] || [];
+        });
+      })
+    );
+    if (input.value !== query) {
+      return;
+    }
+    var docs = postings.reduce(intersect);
+    show(
+      new Set(
+        docs.map(function (doc) {
+          return manifest.docs[doc];
+        })
+      )
+    );
+  }
+
+  input.addEventListener("input", function () {
+    search(input.value);
+  });
+})();
@@ -0,0 +1,207 @@
+"""stream-parse bucket or CDN access logs into per-episode play counters"""
+
+from collections import OrderedDict
+import calendar
+import gzip
+import json
+import logging
+import mmap
+import os
+import re
+from datetime import datetime, timezone
+from urllib.parse import unquote
+
+from radiorumblenyc import jsonfeed
+
+logger = logging.getLogger(__name__)
+
+PLAYS_PATH = "./.build/plays.json"
+AUDIO_EXTENSIONS = (".m4a", ".mp3", ".aac", ".wav")
+# requests from one client for one episode within this window are one play
+PLAY_WINDOW_SECONDS = 24 * 60 * 60
+# ...once together they have fetched at least this much of the file
+MIN_PLAY_BYTES = 1024 * 1024
+# oldest clients are forgotten past this, which bounds memory on huge logs
+MAX_TRACKED_CLIENTS = 200_000
+
+# ip - user [time] "GET /path HTTP/1.1" status bytes "referer" "user agent"
+COMBINED_LOG_PATTERN = re.compile(
+    rb'^(\S+) \S+ \S+ \[([^\]]+)\] "(\S+) (\S+)[^"]*" (\d{3}) (\d+|-)'
+    rb'(?: "[^"]*" "([^"]*)")?'
+)
+# owner bucket [time] ip requester request-id operation key "GET /path HTTP/1.1"
+# status error bytes object-size total-time turnaround "referer" "user agent"
+S3_LOG_PATTERN = re.compile(
+    rb'^\S+ \S+ \[([^\]]+)\] (\S+) \S+ \S+ \S+ \S+ "(\S+) (\S+)[^"]*" (\d{3}) \S+ '
+    rb'(\d+|-) \S+ \S+ \S+ "[^"]*" "([^"]*)"'
+)
+MONTHS = {
+    month.encode(): i
+    for i, month in enumerate(
+        "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split(), start=1
+    )
+}
+
+
+def _log_timestamp(value):
+    """16/Aug/2025:16:55:40 +0000 as epoch seconds, without strptime's overhead"""
+    day, month, year = value[0:2], value[3:6], value[7:11]
+    hour, minute, second = value[12:14], value[15:17], value[18:20]
+    seconds = calendar.timegm(
+        (int(year), MONTHS[month], int(day), int(hour), int(minute), int(second))
+    )
+    tz = value[21:26]
+    if len(tz) == 5:
+        offset = int(tz[1:3]) * 3600 + int(tz[3:5]) * 60
+        seconds -= offset if tz[:1] == b"+" else -offset
+    return seconds
+
+
+def _parse_line(line):
+    match = COMBINED_LOG_PATTERN.match(line)
+    if match:
+        ip, timestamp, method, path, status, sent, user_agent = match.groups()
+    else:
+        match = S3_LOG_PATTERN.match(line)
+        if not match:
+            return None
+        timestamp, ip, method, path, status, sent, user_agent = match.groups()
+    try:
+        timestamp = _log_timestamp(timestamp)
+    except (ValueError, KeyError):
+        # a mangled timestamp costs one line, not the whole run
+        return None
+    return {
+        "ip": ip,
+        "timestamp": timestamp,
+        "method": method,
+        "path": path,
+        "status": status,
+        "sent": 0 if sent == b"-" else int(sent),
+        "user_agent": user_agent or b"",
+    }
+
+
+def _path_to_enclosure_url(path, shows):
+    """
+    Maps a requested path to the enclosure URL of the show whose prefix it contains.
+    Args:
+        path (bytes): The request path, e.g. /file/rumble-nyc-radio/ttt/audio/2025/ep.m4a.
+        shows (list): Shows, longest prefix first.
+    Returns:
+        str: the enclosure URL as it appears in that show's feeds, or None.
+    """
+    path = unquote(path.split(b"?", 1)[0].decode("utf-8", "replace"))
+    if not path.lower().endswith(AUDIO_EXTENSIONS):
+        return None
+    path = f"/{path.lstrip('/')}"
+    for show in shows:
+        index = path.find(f"/{show['prefix']}")
+        if index >= 0:
+            key = path[index + 1 :]
+            return jsonfeed._filepath_to_attachment_url(key, show["audio_base_url"])
+    return None
+
+
+def _iter_lines(log_path):
+    """yield lines from a plain (memory-mapped) or gzip log without reading it all"""
+    if log_path.endswith(".gz"):
+        with gzip.open(log_path, "rb") as f:
+            yield from f
+        return
+    with open(log_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b"")
+
+
+class PlayCounter:
+    """aggregates requests into plays per enclosure URL in bounded memory"""
+
+    def __init__(self, shows=None):
+        self.episodes = {}
+        self._clients = OrderedDict()
+        self._shows = sorted(
+            shows or [jsonfeed.DEFAULT_SHOW],
+            key=lambda show: len(show["prefix"]),
+            reverse=True,
+        )
+
+    def add(self, request):
+        """count one parsed log line"""
+        if request["method"] != b"GET" or request["status"] not in (b"200", b"206"):
+            return
+        url = _path_to_enclosure_url(request["path"], self._shows)
+        if not url:
+            return
+        counters = self.episodes.setdefault(
+            url, {"plays": 0, "requests": 0, "bytes": 0}
+        )
+        counters["requests"] += 1
+        counters["bytes"] += request["sent"]
+
+        timestamp = request["timestamp"]
+        client = (request["ip"], request["user_agent"], url)
+        session = self._clients.get(client)
+        if session is None or timestamp - session[0] > PLAY_WINDOW_SECONDS:
+            session = [timestamp, 0, False]
+            self._clients[client] = session
+        self._clients.move_to_end(client)
+        session[1] += request["sent"]
+        if not session[2] and session[1] >= MIN_PLAY_BYTES:
+            session[2] = True
+            counters["plays"] += 1
+        if len(self._clients) > MAX_TRACKED_CLIENTS:
+            self._clients.popitem(last=False)
+
+    def add_log(self, log_path):
+        """stream one log file through the counter"""
+        logger.info("reading %s ...", log_path)
+        skipped = 0
+        for line in _iter_lines(log_path):
+            request = _parse_line(line)
+            if request:
+                self.add(request)
+            else:
+                skipped += 1
+        if skipped:
+            logger.warning("skipped %d unparseable lines in %s", skipped, log_path)
+
+
+def count_plays(log_paths, shows=None) -> dict:
+    """
+    Aggregates downloads per enclosure URL across access logs in a single pass.
+    Args:
+        log_paths (list): Plain or gzip access logs, combined or S3 server format.
+        shows (list): The configured shows, to attribute each request to its
+            show by prefix (Radio Rumble alone by default).
+    Returns:
+        dict: enclosure URLs mapped to their plays, requests and bytes sent.
+    """
+    counter = PlayCounter(shows)
+    for log_path in log_paths:
+        counter.add_log(log_path)
+    return counter.episodes
+
+
+def write_plays(episodes, path=PLAYS_PATH):
+    """write compact per-episode counters"""
+    logger.info("writing %s ...", path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    plays = {
+        "generated": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        "episodes": episodes,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(plays, separators=(",", ":"), sort_keys=True))
+
+
+def load_play_counts(path=PLAYS_PATH) -> dict:
+    """enclosure URLs mapped to play counts, or {} before analytics has run"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            episodes = json.load(f)["episodes"]
+    except FileNotFoundError:
+        return {}
+    return {url: counters["plays"] for url, counters in episodes.items()}
@@ -0,0 +1,136 @@
+"""resolve episode artwork from cover art embedded in the bucket's m4a files"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+
+from radiorumblenyc import assets
+from radiorumblenyc import catalog
+from radiorumblenyc import mp4atoms
+from radiorumblenyc import s3
+
+logger = logging.getLogger(__name__)
+
+COVER_EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "bmp": ".bmp"}
+MP4_EXTENSIONS = (".m4a", ".m4b", ".mp4")
+READ_AHEAD_BYTES = 64 * 1024
+RESOLVE_WORKERS = 8
+# recorded in the catalog's artifact hashes when a file has no embedded cover
+NO_COVER = ""
+
+
+class RangeReader:
+    """a read-only, seekable file over an S3 object, fetched with ranged GETs"""
+
+    def __init__(self, client, bucket_name, key, size):
+        self._client = client
+        self._bucket_name = bucket_name
+        self._key = key
+        self._size = size
+        self._position = 0
+        self._segments = []
+        self.requests = 0
+
+    def seek(self, offset):
+        self._position = offset
+
+    def _cached(self, start, end):
+        for segment_start, data in self._segments:
+            if segment_start <= start and end <= segment_start + len(data):
+                return data[start - segment_start : end - segment_start]
+        return None
+
+    def read(self, size):
+        start = self._position
+        end = min(start + size, self._size)
+        if start >= end:
+            return b""
+        data = self._cached(start, end)
+        if data is None:
+            fetch_end = min(max(end, start + READ_AHEAD_BYTES), self._size)
+            response = self._client.get_object(
+                Bucket=self._bucket_name,
+                Key=self._key,
+                Range=f"bytes={start}-{fetch_end - 1}",
+            )
+            self.requests += 1
+            self._segments.append((start, response["Body"].read()))
+            data = self._cached(start, end)
+        self._position = end
+        return data
+
+
+def _probe(client, bucket_name, key, size):
+    """read just the atom headers and moov of a remote MP4 file"""
+    reader = RangeReader(client, bucket_name, key, size)
+    atoms = mp4atoms.read_top_level_atoms(reader, size)
+    moov = mp4atoms.find_atom(atoms, b"moov")
+    if not moov:
+        logger.warning("no moov atom in %s", key)
+        return {"cover": None, "duration": None}
+    reader.seek(moov["offset"] + moov["header_size"])
+    moov_payload = reader.read(moov["size"] - moov["header_size"])
+    logger.debug("probed %s with %d range requests", key, reader.requests)
+    return {
+        "cover": mp4atoms.find_cover_art(moov_payload),
+        "duration": mp4atoms.movie_duration(moov_payload),
+    }
+
+
+def _publish_cover(cover, show):
+    """write cover bytes under a content-hashed name; return (hash, public URL)"""
+    image_format, image_data = cover
+    digest = hashlib.sha256(image_data).hexdigest()[:16]
+    relpath = f"{assets.COVERS_DIR}/{digest}{COVER_EXTENSIONS[image_format]}"
+    filepath = os.path.join(show["output_dir"], relpath)
+    if not os.path.exists(filepath):
+        logger.info("writing cover %s", filepath)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, "wb") as f:
+            f.write(image_data)
+    return digest, f"{show['base_url']}/{relpath}"
+
+
+def resolve_covers(conn, show, bucket_name):
+    """
+    Replaces guessed artwork with the cover embedded in each episode's m4a.
+    Only episodes whose current ETag has not been probed yet are fetched, and
+    only their atom headers and moov atom are downloaded. Episodes without an
+    embedded cover keep the artwork matched from their filename.
+    Args:
+        conn (sqlite3.Connection): An open catalog connection.
+        show (dict): The show whose episodes to resolve.
+        bucket_name (str): The bucket the episodes live in.
+    """
+    pending = [
+        row
+        for row in catalog.missing_artifact(conn, show["name"], "cover")
+        if row["key"].lower().endswith(MP4_EXTENSIONS)
+    ]
+    if not pending:
+        return
+    logger.info("probing %d episodes for cover art", len(pending))
+    client = s3._get_s3_resource().meta.client
+
+    def _probe_row(row):
+        try:
+            return _probe(client, bucket_name, row["key"], row["size"])
+        except Exception:
+            logger.exception("could not probe %s", row["key"])
+            return None
+
+    with ThreadPoolExecutor(max_workers=RESOLVE_WORKERS) as pool:
+        probes = list(pool.map(_probe_row, pending))
+
+    for row, probe in zip(pending, probes):
+        if probe is None:
+            continue
+        if probe["duration"]:
+            catalog.set_duration(conn, row["key"], probe["duration"])
+        if not probe["cover"]:
+            catalog.set_artifact_hash(conn, row["key"], "cover", NO_COVER)
+            continue
+        digest, image = _publish_cover(probe["cover"], show)
+        catalog.set_image(conn, row["key"], image)
+        catalog.set_artifact_hash(conn, row["key"], "cover", digest)
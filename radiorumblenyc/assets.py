@@ -0,0 +1,92 @@
+"""fingerprint static assets with content-hashed filenames and rewrite references to them"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIRS = ["images", "js", "css"]
+ASSET_EXTENSIONS = [".png", ".jpg", ".jpeg", ".gif", ".js", ".css"]
+MANIFEST_FILENAME = "asset-manifest.json"
+HASH_LENGTH = 10
+# extracted cover art is already named by its content hash, so it is published as-is
+COVERS_DIR = "images/covers"
+
+
+def _file_digest(filepath):
+    with open(filepath, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()[:HASH_LENGTH]
+
+
+def _fingerprinted_path(relpath, digest):
+    root, ext = os.path.splitext(relpath)
+    return f"{root}.{digest}{ext}"
+
+
+def fingerprint_assets(output_dir="./public") -> dict:
+    """
+    Hashes every image, JS and CSS file under a show's output directory.
+    Args:
+        output_dir (str): The directory the show's outputs are written to.
+    Returns:
+        dict: paths relative to output_dir mapped to their fingerprinted paths.
+    """
+    manifest = {}
+    for asset_dir in ASSET_DIRS:
+        for dir_name, _dirs, files in os.walk(os.path.join(output_dir, asset_dir)):
+            for filename in files:
+                if os.path.splitext(filename)[1].lower() not in ASSET_EXTENSIONS:
+                    continue
+                filepath = os.path.join(dir_name, filename)
+                relpath = os.path.relpath(filepath, output_dir)
+                if os.path.dirname(relpath) == COVERS_DIR:
+                    manifest[relpath] = relpath
+                    continue
+                manifest[relpath] = _fingerprinted_path(relpath, _file_digest(filepath))
+    logger.info("fingerprinted %d assets in %s", len(manifest), output_dir)
+    return manifest
+
+
+def _reference_pattern(manifest, base_url):
+    # longest first so a path never shadows a longer one it prefixes
+    relpaths = sorted(manifest, key=len, reverse=True)
+    alternation = "|".join(re.escape(p) for p in relpaths)
+    return re.compile(
+        rf"(?:(?<={re.escape(base_url)}/)|(?<=[\"']))({alternation})(?=[\\\"'<)\s]|$)"
+    )
+
+
+def rewrite_references(text: str, manifest: dict, base_url: str) -> str:
+    """point absolute and quoted relative asset references at their fingerprinted paths"""
+    if not manifest:
+        return text
+    pattern = _reference_pattern(manifest, base_url)
+    return pattern.sub(lambda m: manifest[m.group(1)], text)
+
+
+def rewrite_json_feed(json_feed: dict, manifest: dict, base_url: str) -> dict:
+    """return a copy of a JSON feed with asset references fingerprinted"""
+    if not manifest:
+        return json_feed
+    pattern = _reference_pattern(manifest, base_url)
+
+    def _rewrite(value):
+        if isinstance(value, str):
+            return pattern.sub(lambda m: manifest[m.group(1)], value)
+        if isinstance(value, list):
+            return [_rewrite(v) for v in value]
+        if isinstance(value, dict):
+            return {k: _rewrite(v) for k, v in value.items()}
+        return value
+
+    return _rewrite(json_feed)
+
+
+def write_manifest(manifest: dict, output_dir="./public"):
+    """write the asset manifest next to the show's other outputs"""
+    logger.info("writing %s/%s ...", output_dir, MANIFEST_FILENAME)
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        f.write(json.dumps(manifest, indent=2, sort_keys=True))
@@ -1,17 +1,21 @@
-"""a module that attaches images to audio files"""
+"""prepares episode audio for upload: embeds cover art and makes MP4s faststart"""
 
+import argparse
 import logging
 import os
 import re
 import sys
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from mutagen.mp4 import MP4, MP4Cover, AtomDataType
 
+from radiorumblenyc import mp4atoms
 
 logger = logging.getLogger(__name__)
 
 BASE_URL = "./public/"
+MP4_EXTENSIONS = [".m4a", ".m4b", ".mp4"]
+COPY_CHUNK_SIZE = 1024 * 1024
 
 
 def _filepath_to_episode_number_words(filepath) -> Optional[int]:
@@ -122,13 +126,169 @@ def process_audio_paths(paths):
     return audio_files
 
 
-def main():
-    # Example usage
+def _scan_atoms(f):
+    file_size = os.fstat(f.fileno()).st_size
+    return mp4atoms.read_top_level_atoms(f, file_size)
+
+
+def _missing_atoms(atoms):
+    return [t for t in (b"moov", b"mdat") if not mp4atoms.find_atom(atoms, t)]
+
+
+def _is_faststart(atoms):
+    moov = mp4atoms.find_atom(atoms, b"moov")
+    mdat = mp4atoms.find_atom(atoms, b"mdat")
+    return moov["offset"] < mdat["offset"]
+
+
+def is_faststart(audio_file_path) -> bool:
+    """
+    True when the moov atom comes before the media data.
+    Raises ValueError for a file with no moov or mdat atom (e.g. a truncated
+    upload), which no player can stream either way.
+    """
+    with open(audio_file_path, "rb") as f:
+        atoms = _scan_atoms(f)
+    missing = _missing_atoms(atoms)
+    if missing:
+        raise ValueError(
+            f"{audio_file_path} has no {' or '.join(t.decode() for t in missing)} atom"
+        )
+    return _is_faststart(atoms)
+
+
+def _copy_range(src, dst, offset, length):
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, length))
+        if not chunk:
+            raise EOFError(f"unexpected end of file at {offset}")
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def _relocated_moov(moov_bytes, mdat_start, moov_start, moov_end):
+    """rewrite chunk offsets until the new moov size is stable (stco may grow into co64)"""
+    new_size = moov_end - moov_start
+    while True:
+        shift_from_moov = new_size - (moov_end - moov_start)
+
+        def shift(offset, new_size=new_size, shift_from_moov=shift_from_moov):
+            if offset >= moov_end:
+                return offset + shift_from_moov
+            if offset >= mdat_start:
+                return offset + new_size
+            return offset
+
+        tree = mp4atoms.parse_atom_tree(moov_bytes)
+        mp4atoms.shift_chunk_offsets(tree, shift)
+        relocated = mp4atoms.serialize_atom_tree(tree)
+        if len(relocated) == new_size:
+            return relocated
+        new_size = len(relocated)
+
+
+def make_faststart(src_path, dst_path) -> bool:
+    """
+    Copies an MP4 file with its moov atom moved in front of the media data.
+    The media data is streamed in chunks; only the moov atom is held in memory.
+    Returns False, without writing dst_path, when the file is already faststart.
+    """
+    with open(src_path, "rb") as src:
+        atoms = _scan_atoms(src)
+        if _missing_atoms(atoms):
+            raise ValueError(f"{src_path} has no moov or mdat atom")
+        if _is_faststart(atoms):
+            return False
+        moov = mp4atoms.find_atom(atoms, b"moov")
+        mdat = mp4atoms.find_atom(atoms, b"mdat")
+        src.seek(moov["offset"])
+        moov_bytes = src.read(moov["size"])
+        relocated = _relocated_moov(
+            moov_bytes, mdat["offset"], moov["offset"], moov["offset"] + moov["size"]
+        )
+
+        with open(dst_path, "wb") as dst:
+            for atom in atoms:
+                if atom["offset"] >= mdat["offset"]:
+                    break
+                _copy_range(src, dst, atom["offset"], atom["size"])
+            dst.write(relocated)
+            for atom in atoms:
+                if atom["offset"] >= mdat["offset"] and atom is not moov:
+                    _copy_range(src, dst, atom["offset"], atom["size"])
+    logger.info("relocated moov (%d bytes) in %s", len(relocated), src_path)
+    return True
+
+
+def faststart_directory(directory, check_only=False) -> Tuple[List[str], List[str]]:
+    """
+    Finds MP4 audio files under a directory whose moov atom is not at the front
+    and, unless check_only, rewrites them in place.
+    Returns the paths that were not faststart, and the paths that are broken
+    (no moov or mdat atom) and were left alone.
+    """
+    not_faststart = []
+    broken = []
+    for dir_name, _dirs, files in os.walk(directory):
+        for filename in sorted(files):
+            if os.path.splitext(filename)[1].lower() not in MP4_EXTENSIONS:
+                continue
+            audio_file_path = os.path.join(dir_name, filename)
+            try:
+                faststart = is_faststart(audio_file_path)
+            except ValueError as e:
+                logger.error("broken: %s", e)
+                broken.append(audio_file_path)
+                continue
+            if faststart:
+                logger.debug("faststart: %s", audio_file_path)
+                continue
+            logger.warning("not faststart: %s", audio_file_path)
+            not_faststart.append(audio_file_path)
+            if check_only:
+                continue
+            tmp_path = f"{audio_file_path}.faststart.tmp"
+            try:
+                make_faststart(audio_file_path, tmp_path)
+                os.replace(tmp_path, audio_file_path)
+            finally:
+                # a failed rewrite must not leave a partial copy next to the original
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    return not_faststart, broken
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="prepare episode audio before upload")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    covers = subparsers.add_parser("covers", help="embed matching artwork as covr")
+    covers.add_argument("paths", nargs="+")
+    faststart = subparsers.add_parser(
+        "faststart", help="move the moov atom in front of the media data"
+    )
+    faststart.add_argument("directory", nargs="?", default="./audio")
+    faststart.add_argument(
+        "--check", action="store_true", help="only report files that need it"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """python -m radiorumblenyc.audiofiles faststart ./audio"""
     logging.basicConfig(level=logging.DEBUG, stream=sys.stdout)
-    audio_paths = [
-        "./audio/radio-rumble-ep-8-springtime-house.m4a",
-    ]
-    process_audio_paths(audio_paths)
+    args = _parse_args(argv)
+    if args.command == "covers":
+        process_audio_paths(args.paths)
+    elif args.command == "faststart":
+        not_faststart, broken = faststart_directory(
+            args.directory, check_only=args.check
+        )
+        logger.info("%d files were not faststart", len(not_faststart))
+        if broken:
+            logger.error("%d files have no moov or mdat atom", len(broken))
+        if broken or (args.check and not_faststart):
+            sys.exit(1)
 
 
 if __name__ == "__main__":
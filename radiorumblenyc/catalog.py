@@ -0,0 +1,324 @@
+"""a local SQLite catalog of episodes, upserted from bucket listings"""
+
+from datetime import datetime
+import json
+import logging
+import os
+import sqlite3
+from typing import Optional
+
+from radiorumblenyc import jsonfeed
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = "./.build/catalog.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    key TEXT PRIMARY KEY,
+    show TEXT NOT NULL,
+    etag TEXT,
+    size INTEGER NOT NULL,
+    last_modified TEXT NOT NULL,
+    episode_number INTEGER,
+    date TEXT NOT NULL,
+    title TEXT,
+    image TEXT,
+    duration REAL,
+    artifact_hashes TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS episodes_show_date ON episodes (show, date);
+CREATE INDEX IF NOT EXISTS episodes_show_episode_number
+    ON episodes (show, episode_number);
+CREATE TABLE IF NOT EXISTS rendered_items (
+    key TEXT PRIMARY KEY,
+    show TEXT NOT NULL,
+    render_key TEXT NOT NULL,
+    output TEXT NOT NULL
+);
+"""
+
+
+def connect(path=CATALOG_PATH) -> sqlite3.Connection:
+    """open (and create if needed) the catalog database"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# episodes whose artwork comes from filename matching rather than embedded cover art
+MATCHED_ARTWORK_SQL = """
+    SELECT key, image FROM episodes
+    WHERE show = ? AND IFNULL(json_extract(artifact_hashes, '$.cover'), '') = ''
+"""
+
+
+def _derived_columns(obj, show, image_relpaths):
+    """the columns parsed from the key, only recomputed when an object changes"""
+    slug = jsonfeed._audio_filepath_to_slug(obj["path"])
+    return {
+        "episode_number": jsonfeed._filepath_to_episode_number(obj["path"]),
+        "date": obj["last_modified"].replace(microsecond=0).isoformat(),
+        "title": jsonfeed._title_from_slug(slug) if slug else None,
+        "image": _match_image(obj["path"], image_relpaths, show),
+    }
+
+
+def _image_relpaths(show):
+    """every image in a show's images dir, in the order jsonfeed matches them"""
+    output_dir = show["output_dir"]
+    return [
+        os.path.relpath(f"{dir_name}/{filename}", output_dir)
+        for dir_name, _dirs, files in os.walk(f"{output_dir}/images")
+        for filename in files
+    ]
+
+
+def _match_image(key, image_relpaths, show):
+    for relpath in image_relpaths:
+        if jsonfeed._match_audio_to_image_filepath(key, relpath):
+            return f"{show['base_url']}/{relpath}"
+    return None
+
+
+def upsert_objects(conn, show, objects, rematch_artwork=True) -> dict:
+    """
+    Applies a listing of a show's objects to the catalog.
+    Args:
+        conn (sqlite3.Connection): An open catalog connection.
+        show (dict): The show the objects were routed to.
+        objects (list): Listed objects with path, content_length, last_modified and etag.
+        rematch_artwork (bool): Re-match every filename-matched episode against the
+            images dir; False when rematch_images already handled the changed images.
+    Returns:
+        dict: the keys that were added, changed and removed.
+    """
+    existing = {
+        row["key"]: (row["etag"], row["last_modified"])
+        for row in conn.execute(
+            "SELECT key, etag, last_modified FROM episodes WHERE show = ?",
+            (show["name"],),
+        )
+    }
+    diff = {"added": [], "changed": [], "removed": []}
+    image_relpaths = _image_relpaths(show)
+    with conn:
+        for obj in objects:
+            key = obj["path"]
+            last_modified = obj["last_modified"].isoformat()
+            if key not in existing:
+                diff["added"].append(key)
+            elif existing[key] != (obj.get("etag"), last_modified):
+                diff["changed"].append(key)
+            else:
+                continue
+            conn.execute(
+                """
+                INSERT INTO episodes (
+                    key, show, etag, size, last_modified,
+                    episode_number, date, title, image
+                ) VALUES (
+                    :key, :show, :etag, :size, :last_modified,
+                    :episode_number, :date, :title, :image
+                )
+                ON CONFLICT (key) DO UPDATE SET
+                    show = excluded.show,
+                    etag = excluded.etag,
+                    size = excluded.size,
+                    last_modified = excluded.last_modified,
+                    episode_number = excluded.episode_number,
+                    date = excluded.date,
+                    title = excluded.title,
+                    image = excluded.image,
+                    duration = NULL,
+                    artifact_hashes = '{}'
+                """,
+                {
+                    "key": key,
+                    "show": show["name"],
+                    "etag": obj.get("etag"),
+                    "size": obj["content_length"],
+                    "last_modified": last_modified,
+                    **_derived_columns(obj, show, image_relpaths),
+                },
+            )
+
+        listed = {obj["path"] for obj in objects}
+        diff["removed"] = sorted(set(existing) - listed)
+        conn.executemany(
+            "DELETE FROM episodes WHERE key = ?", [(k,) for k in diff["removed"]]
+        )
+
+        # images are added, renamed and removed between builds, so re-match
+        # every episode that isn't using its embedded cover art (unless the
+        # caller has already re-matched the episodes its changed images cover)
+        rematched = 0
+        if rematch_artwork:
+            for row in conn.execute(MATCHED_ARTWORK_SQL, (show["name"],)).fetchall():
+                image = _match_image(row["key"], image_relpaths, show)
+                if image != row["image"]:
+                    conn.execute(
+                        "UPDATE episodes SET image = ? WHERE key = ?",
+                        (image, row["key"]),
+                    )
+                    rematched += 1
+    logger.info(
+        "catalog %s: %d added %d changed %d removed, %d re-matched artwork",
+        show["name"],
+        len(diff["added"]),
+        len(diff["changed"]),
+        len(diff["removed"]),
+        rematched,
+    )
+    return diff
+
+
+def rematch_images(conn, show, image_relpaths) -> list:
+    """
+    Re-matches artwork for only the episodes a set of changed images could cover.
+    Episodes using embedded cover art keep it.
+    Args:
+        conn (sqlite3.Connection): An open catalog connection.
+        show (dict): The show whose images changed.
+        image_relpaths (list): The changed image paths, relative to the show's output_dir.
+    Returns:
+        list: the keys whose artwork changed.
+    """
+    image_urls = {f"{show['base_url']}/{relpath}" for relpath in image_relpaths}
+    current_relpaths = _image_relpaths(show)
+    updated = []
+    with conn:
+        for row in conn.execute(MATCHED_ARTWORK_SQL, (show["name"],)).fetchall():
+            if row["image"] not in image_urls and not any(
+                jsonfeed._match_audio_to_image_filepath(row["key"], relpath)
+                for relpath in image_relpaths
+            ):
+                continue
+            image = _match_image(row["key"], current_relpaths, show)
+            if image != row["image"]:
+                conn.execute(
+                    "UPDATE episodes SET image = ? WHERE key = ?", (image, row["key"])
+                )
+                updated.append(row["key"])
+    logger.info(
+        "catalog %s: re-matched artwork for %d episodes", show["name"], len(updated)
+    )
+    return updated
+
+
+def _row_to_audio_path(row):
+    return {
+        "path": row["key"],
+        "content_length": row["size"],
+        "last_modified": datetime.fromisoformat(row["last_modified"]),
+        "etag": row["etag"],
+        "title": row["title"],
+        "image": row["image"],
+        "duration": row["duration"],
+    }
+
+
+def audio_paths(conn, show_name, limit: Optional[int] = None) -> list:
+    """the latest episodes of a show, newest first, in the shape jsonfeed expects"""
+    rows = conn.execute(
+        "SELECT * FROM episodes WHERE show = ? ORDER BY date DESC LIMIT ?",
+        (show_name, -1 if limit is None else limit),
+    )
+    return [_row_to_audio_path(row) for row in rows]
+
+
+def episode_by_number(conn, show_name, episode_number):
+    """look up a show's episode by its parsed episode number"""
+    row = conn.execute(
+        "SELECT * FROM episodes WHERE show = ? AND episode_number = ?",
+        (show_name, episode_number),
+    ).fetchone()
+    return _row_to_audio_path(row) if row else None
+
+
+def missing_artifact(conn, show_name, name) -> list:
+    """a show's episodes with no recorded hash for a derived artifact"""
+    return conn.execute(
+        """
+        SELECT * FROM episodes
+        WHERE show = ? AND json_extract(artifact_hashes, ?) IS NULL
+        """,
+        (show_name, f"$.{name}"),
+    ).fetchall()
+
+
+def set_image(conn, key, image):
+    """store the artwork URL for an episode"""
+    with conn:
+        conn.execute("UPDATE episodes SET image = ? WHERE key = ?", (image, key))
+
+
+def set_duration(conn, key, duration):
+    """store a probed duration in seconds"""
+    with conn:
+        conn.execute("UPDATE episodes SET duration = ? WHERE key = ?", (duration, key))
+
+
+def rendered_items(conn, show_name) -> dict:
+    """a show's cached item renders: keys mapped to (render key, output)"""
+    return {
+        row["key"]: (row["render_key"], json.loads(row["output"]))
+        for row in conn.execute(
+            "SELECT key, render_key, output FROM rendered_items WHERE show = ?",
+            (show_name,),
+        )
+    }
+
+
+def save_rendered_items(conn, show_name, rendered: dict, keys):
+    """
+    Stores fresh item renders and drops the cached renders of any other keys.
+    Args:
+        conn (sqlite3.Connection): An open catalog connection.
+        show_name (str): The show the items belong to.
+        rendered (dict): Newly rendered keys mapped to (render key, output).
+        keys (list): Every key in the show's current build.
+    """
+    keep = set(keys)
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO rendered_items (key, show, render_key, output)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                show = excluded.show,
+                render_key = excluded.render_key,
+                output = excluded.output
+            """,
+            [
+                (key, show_name, render_key, json.dumps(output))
+                for key, (render_key, output) in rendered.items()
+            ],
+        )
+        stale = [
+            (row["key"],)
+            for row in conn.execute(
+                "SELECT key FROM rendered_items WHERE show = ?", (show_name,)
+            )
+            if row["key"] not in keep
+        ]
+        conn.executemany("DELETE FROM rendered_items WHERE key = ?", stale)
+
+
+def set_artifact_hash(conn, key, name, digest):
+    """record the hash of an artifact derived from an episode (e.g. cover art)"""
+    row = conn.execute(
+        "SELECT artifact_hashes FROM episodes WHERE key = ?", (key,)
+    ).fetchone()
+    if not row:
+        return
+    hashes = json.loads(row["artifact_hashes"])
+    hashes[name] = digest
+    with conn:
+        conn.execute(
+            "UPDATE episodes SET artifact_hashes = ? WHERE key = ?",
+            (json.dumps(hashes, sort_keys=True), key),
+        )
@@ -0,0 +1,341 @@
+"""watch templates, images and local audio, rebuilding only the outputs a change affects"""
+
+from contextlib import closing
+from datetime import datetime, timezone
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+
+from radiorumblenyc import assets
+from radiorumblenyc import catalog
+from radiorumblenyc import pipeline
+from radiorumblenyc import shows as shows_config
+
+logger = logging.getLogger(__name__)
+
+AUDIO_DIR = "./audio"
+# local-only episodes have no ETag, so dev builds keep them out of the shared catalog
+DEV_CATALOG_PATH = "./.build/dev-catalog.sqlite3"
+AUDIO_EXTENSIONS = (".m4a", ".mp3", ".aac", ".wav")
+# changes arriving this close together (an editor's save, a copied folder) are one batch
+DEBOUNCE_SECONDS = 0.05
+POLL_SECONDS = 0.5
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """recursively watches directories with Linux inotify, via ctypes"""
+
+    def __init__(self, roots):
+        libc_path = ctypes.util.find_library("c")
+        if not libc_path:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_path, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._roots = roots
+        self._watches = {}
+        for root in roots:
+            self._watch_tree(root)
+
+    def _watch_tree(self, directory):
+        """watch a directory and its subdirectories, returning the files in them"""
+        files = set()
+        for dir_name, _dirs, filenames in os.walk(directory):
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(dir_name), WATCH_MASK
+            )
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"cannot watch {dir_name}")
+            self._watches[wd] = dir_name
+            files.update(os.path.join(dir_name, f) for f in filenames)
+        return files
+
+    def _read_events(self):
+        changed = set()
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(
+                    "inotify queue overflowed, treating everything as changed"
+                )
+                for root in self._roots:
+                    changed.update(PollingWatcher._snapshot_tree(root))
+                continue
+            if wd not in self._watches or not name:
+                continue
+            path = os.path.join(self._watches[wd], name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and os.path.isdir(path):
+                    changed.update(self._watch_tree(path))
+                continue
+            changed.add(path)
+        return changed
+
+    def wait(self, timeout=None) -> set:
+        """block until files change, returning the batch of changed paths"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = self._read_events()
+        while select.select([self._fd], [], [], DEBOUNCE_SECONDS)[0]:
+            changed |= self._read_events()
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """compares file mtimes and sizes, for systems without inotify"""
+
+    def __init__(self, roots):
+        self._roots = roots
+        self._snapshot = self._take_snapshot()
+
+    @staticmethod
+    def _snapshot_tree(root):
+        snapshot = {}
+        for dir_name, _dirs, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dir_name, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _take_snapshot(self):
+        snapshot = {}
+        for root in self._roots:
+            snapshot.update(self._snapshot_tree(root))
+        return snapshot
+
+    def wait(self, timeout=None) -> set:
+        """poll until files change, returning the batch of changed paths"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            snapshot = self._take_snapshot()
+            changed = {
+                path
+                for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+        return set()
+
+    def close(self):
+        pass
+
+
+def make_watcher(roots, poll=False):
+    """an inotify watcher where available, else a polling one"""
+    roots = [root for root in roots if os.path.isdir(root)]
+    if not poll:
+        try:
+            watcher = InotifyWatcher(roots)
+            logger.info("watching %s with inotify", ", ".join(roots))
+            return watcher
+        except (OSError, AttributeError) as e:
+            logger.info("inotify unavailable (%s), polling instead", e)
+    logger.info("polling %s every %ss", ", ".join(roots), POLL_SECONDS)
+    return PollingWatcher(roots)
+
+
+def _local_audio_object(filepath, audio_dir=AUDIO_DIR):
+    """a local audio file in the shape of a bucket listing entry"""
+    stat = os.stat(filepath)
+    return {
+        "path": f"audio/{os.path.relpath(filepath, audio_dir)}",
+        "content_length": stat.st_size,
+        "last_modified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+        "etag": None,
+    }
+
+
+def _is_within(path, directory):
+    directory = os.path.abspath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+class DevBuilder:
+    """keeps each show's objects and last build, and applies batches of file changes"""
+
+    def __init__(self, config, audio_dir=AUDIO_DIR, catalog_path=DEV_CATALOG_PATH):
+        self.config = config
+        self.audio_dir = audio_dir
+        self.catalog_path = catalog_path
+        self.objects = {}
+        self.builds = {}
+
+    def roots(self) -> list:
+        """every directory whose files feed into an output"""
+        roots = {self.audio_dir}
+        for show in self.config["shows"]:
+            for asset_dir in assets.ASSET_DIRS:
+                roots.add(os.path.join(show["output_dir"], asset_dir))
+            if show["template"]:
+                roots.add(os.path.dirname(show["template"]) or ".")
+        return sorted(roots)
+
+    def _local_audio(self):
+        local = []
+        for dir_name, _dirs, filenames in os.walk(self.audio_dir):
+            for filename in filenames:
+                if filename.lower().endswith(AUDIO_EXTENSIONS):
+                    filepath = os.path.join(dir_name, filename)
+                    local.append(_local_audio_object(filepath, self.audio_dir))
+        return local
+
+    def build_all(self):
+        """build every show from the catalog's last listing plus local audio, without S3"""
+        with closing(catalog.connect()) as conn:
+            catalogued = {
+                show["name"]: catalog.audio_paths(conn, show["name"])
+                for show in self.config["shows"]
+            }
+            # start each session from a fresh copy, so local episodes don't linger
+            with closing(catalog.connect(self.catalog_path)) as dev_conn:
+                conn.backup(dev_conn)
+        local = shows_config.route_objects(self._local_audio(), self.config["shows"])
+        for show in self.config["shows"]:
+            objects = {
+                obj["path"]: {
+                    k: obj[k]
+                    for k in ["path", "content_length", "last_modified", "etag"]
+                }
+                for obj in catalogued[show["name"]]
+            }
+            objects.update((obj["path"], obj) for obj in local[show["name"]])
+            self.objects[show["name"]] = objects
+            self.builds[show["name"]] = pipeline.build_show(
+                show, list(objects.values()), catalog_path=self.catalog_path
+            )
+
+    def _audio_changed(self, show, paths):
+        objects = self.objects[show["name"]]
+        changed = False
+        for path in paths:
+            if not path.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            key = f"audio/{os.path.relpath(path, self.audio_dir)}"
+            if not key.startswith(show["prefix"]):
+                continue
+            if os.path.isfile(path):
+                objects[key] = _local_audio_object(path, self.audio_dir)
+            else:
+                objects.pop(key, None)
+            changed = True
+        return changed
+
+    def apply(self, paths):
+        """
+        Rebuilds only the outputs that depend on the changed files:
+        a template edit re-renders index.html; an image re-matches the
+        episodes it could cover and re-renders those items; local audio
+        adds, updates or removes its episode.
+        Args:
+            paths (set): The changed file paths.
+        """
+        paths = {os.path.abspath(path) for path in paths}
+        for show in self.config["shows"]:
+            started = time.perf_counter()
+            output_dir = show["output_dir"]
+            images_dir = os.path.join(output_dir, "images")
+            image_relpaths = [
+                os.path.relpath(path, os.path.abspath(output_dir))
+                for path in paths
+                if _is_within(path, images_dir)
+            ]
+            other_assets = any(
+                _is_within(path, os.path.join(output_dir, asset_dir))
+                for path in paths
+                for asset_dir in assets.ASSET_DIRS
+                if asset_dir != "images"
+            )
+            audio = self._audio_changed(
+                show, [p for p in paths if _is_within(p, self.audio_dir)]
+            )
+            template = show["template"] and os.path.abspath(show["template"]) in paths
+
+            reasons = []
+            if image_relpaths:
+                with closing(catalog.connect(self.catalog_path)) as conn:
+                    catalog.rematch_images(conn, show, image_relpaths)
+                reasons.append(f"{len(image_relpaths)} images")
+            if other_assets:
+                reasons.append("assets")
+            if audio:
+                reasons.append("audio")
+            if reasons:
+                # build_all matched every episode; since then only the episodes
+                # rematch_images just covered can have different artwork
+                self.builds[show["name"]] = pipeline.build_show(
+                    show,
+                    list(self.objects[show["name"]].values()),
+                    catalog_path=self.catalog_path,
+                    rematch_artwork=False,
+                )
+            elif template:
+                reasons.append("template")
+                self.builds[show["name"]] = pipeline.rebuild_html(
+                    self.builds[show["name"]]
+                )
+            else:
+                continue
+            logger.info(
+                "rebuilt %s (%s) in %.0f ms",
+                show["name"],
+                ", ".join(reasons),
+                (time.perf_counter() - started) * 1000,
+            )
+
+
+def run(config, poll=False):
+    """
+    Builds every show once, then rebuilds on each batch of file changes until interrupted.
+    Args:
+        config (dict): The loaded shows config.
+        poll (bool): Poll for changes even where inotify is available.
+    """
+    builder = DevBuilder(config)
+    # so episodes dropped into a fresh checkout are picked up too
+    os.makedirs(builder.audio_dir, exist_ok=True)
+    builder.build_all()
+    watcher = make_watcher(builder.roots(), poll)
+    try:
+        while True:
+            changed = watcher.wait()
+            if not changed:
+                continue
+            try:
+                builder.apply(changed)
+            except Exception:
+                logger.exception("rebuild failed, waiting for the next change")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
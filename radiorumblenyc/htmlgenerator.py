@@ -1,22 +1,98 @@
 """create HTML from a JSON Feed dictionary"""
 
+from datetime import datetime
+import html
 import logging
 from string import Template
 
+from radiorumblenyc import searchindex
+
 logger = logging.getLogger(__name__)
 
 
-def json_feed_to_html(json_feed: dict) -> str:
-    """Turn s JSON feed dictionary into an HTML string"""
-    previous_episodes_html = "\n".join([i["content_html"] for i in json_feed["items"]])
-    with open("templates/index.html.tmpl", encoding="utf-8") as f:
+TEMPLATE_PATH = "templates/index.html.tmpl"
+# "lazy" cards get a player attached by js/player.js when played or scrolled into
+# view; "none" cards carry an <audio preload="none"> that fetches nothing until played
+PLAYER_MODES = ["lazy", "none"]
+MOST_PLAYED_COUNT = 5
+
+
+def _display_date(date_published):
+    dt = datetime.fromisoformat(date_published)
+    return f"{dt:%B} {dt.day}, {dt.year}"
+
+
+def _item_card_html(item, player="lazy"):
+    """a lightweight episode card: artwork, title and date, with no audio requests"""
+    attachment = item["attachments"][0]
+    title = html.escape(item["title"])
+    image = html.escape(item["image"] or "")
+    src = html.escape(attachment["url"])
+    mime_type = html.escape(attachment["mime_type"])
+    artwork = (
+        f'<img class="episode-artwork" src="{image}" alt="" loading="lazy" width="96" height="96">'
+        if image
+        else ""
+    )
+    if player == "none":
+        player_html = f"""<audio controls preload="none">
+    <source src="{src}" type="{mime_type}"/>
+</audio>"""
+    else:
+        player_html = '<button class="episode-play" type="button">Play</button>'
+    return f"""
+<div id="{html.escape(item["id"])}" class="json-feed-item episode-card" data-src="{src}" data-type="{mime_type}">
+{artwork}
+<h3>{title}</h3>
+<date datetime="{item["date_published"]}">{_display_date(item["date_published"])}</date>
+{player_html}
+</div>
+    """.strip()
+
+
+def _most_played_html(items, play_counts):
+    """a short list of the most played episodes, linking to their cards"""
+    played = [
+        (play_counts[i["attachments"][0]["url"]], i)
+        for i in items
+        if play_counts.get(i["attachments"][0]["url"])
+    ]
+    if not played:
+        return ""
+    played.sort(key=lambda p: p[0], reverse=True)
+    entries = "\n".join(
+        f'<li><a href="#{html.escape(i["id"])}">{html.escape(i["title"])}</a> '
+        f'({plays} {"play" if plays == 1 else "plays"})</li>'
+        for plays, i in played[:MOST_PLAYED_COUNT]
+    )
+    return f'<h2>Most played</h2>\n<ol id="mostPlayed">\n{entries}\n</ol>'
+
+
+def json_feed_to_html(
+    json_feed: dict,
+    template_path=TEMPLATE_PATH,
+    player="lazy",
+    play_counts=None,
+    cards=None,
+) -> str:
+    """Turn s JSON feed dictionary (and any already rendered cards) into an HTML string"""
+    if player not in PLAYER_MODES:
+        raise ValueError(
+            f"unknown player mode {player}, expected one of {PLAYER_MODES}"
+        )
+    if cards is None:
+        cards = [_item_card_html(i, player) for i in json_feed["items"]]
+    previous_episodes_html = "\n".join(cards)
+    with open(template_path, encoding="utf-8") as f:
         return Template(f.read()).safe_substitute(
-            previous_episodes=previous_episodes_html
+            previous_episodes=previous_episodes_html,
+            most_played=_most_played_html(json_feed["items"], play_counts or {}),
+            search_index_url=f"{searchindex.SEARCH_DIR}/",
         )
 
 
-def write_html(html: str):
+def write_html(html: str, output_dir="./public"):
     """write index.html"""
-    logger.info("writing index.html ...")
-    with open("./public/index.html", "w", encoding="utf-8") as f:
+    logger.info("writing %s/index.html ...", output_dir)
+    with open(f"{output_dir}/index.html", "w", encoding="utf-8") as f:
         f.write(html)
@@ -14,22 +14,36 @@ BASE_URL = "https://radio.rumble.nyc"
 AUDIO_BASE_URL = "https://f002.backblazeb2.com/file/rumble-nyc-radio"
 
 
-def _filepath_to_item_url(filepath):
+DEFAULT_SHOW = {
+    "name": "radio-rumble",
+    "prefix": "audio/",
+    "title": "Radio Rumble",
+    "description": "an irregular DJ show, mostly about house music",
+    "base_url": BASE_URL,
+    "audio_base_url": AUDIO_BASE_URL,
+    "icon": "images/radio-rumble-nyc-logo-1.png",
+    "output_dir": "./public",
+    "hubs": [],
+}
+
+
+def _filepath_to_item_url(filepath, base_url=BASE_URL):
     episode_path = re.search(r"audio\/(.*)\.", filepath).group(1)
     logger.debug("episode_path: %s", episode_path)
-    return f"{BASE_URL}/{episode_path}"
+    return f"{base_url}/{episode_path}"
 
 
-def _object_to_attachment(obj):
-    url = _filepath_to_attachment_url(obj["path"])
+def _object_to_attachment(obj, audio_base_url=AUDIO_BASE_URL):
+    url = _filepath_to_attachment_url(obj["path"], audio_base_url)
     audio_file_ext = os.path.splitext(obj["path"])[1]
-    return [
-        {
-            "url": url,
-            "mime_type": _get_mime_type_from_ext(audio_file_ext),
-            "size_in_bytes": obj["content_length"],
-        }
-    ]
+    attachment = {
+        "url": url,
+        "mime_type": _get_mime_type_from_ext(audio_file_ext),
+        "size_in_bytes": obj["content_length"],
+    }
+    if obj.get("duration"):
+        attachment["duration_in_seconds"] = round(obj["duration"])
+    return [attachment]
 
 
 def _item_html(**item):
@@ -102,17 +116,17 @@ def _match_audio_to_image_filepath(audio_file_path, image_filepath):
     return False
 
 
-def _audio_filepath_to_image(audio_filepath):
-    for dir_name, _dirs, files in os.walk("./public/images"):
+def _audio_filepath_to_image(audio_filepath, output_dir="./public", base_url=BASE_URL):
+    for dir_name, _dirs, files in os.walk(f"{output_dir}/images"):
         for filename in files:
-            image_filepath = f"{dir_name.replace('/public', '')}/{filename}"
+            image_filepath = os.path.relpath(f"{dir_name}/{filename}", output_dir)
             if _match_audio_to_image_filepath(audio_filepath, image_filepath):
-                return f"{BASE_URL}/{image_filepath.replace('./', '')}"
+                return f"{base_url}/{image_filepath}"
 
 
-def _filepath_to_attachment_url(filepath):
+def _filepath_to_attachment_url(filepath, audio_base_url=AUDIO_BASE_URL):
     public_path = re.search(r"audio\/..*", filepath).group()
-    return f"{AUDIO_BASE_URL}/{public_path}"
+    return f"{audio_base_url}/{public_path}"
 
 
 def _radio_rumble_slug_to_title(slug):
@@ -140,7 +154,7 @@ def _audio_filepath_to_slug(filepath):
     return slug
 
 
-def _audio_path_to_json_feed_item(audio_path):
+def _audio_path_to_json_feed_item(audio_path, show):
     slug = _audio_filepath_to_slug(audio_path["path"])
     if not slug:
         logger.error("no slug for %s", audio_path["path"])
@@ -148,13 +162,18 @@ def _audio_path_to_json_feed_item(audio_path):
     date_published = audio_path["last_modified"].replace(microsecond=0).isoformat()
     logger.debug("date_published %s", date_published)
 
-    item_url = _filepath_to_item_url(audio_path["path"])
-    attachments = _object_to_attachment(audio_path)
-    image = _audio_filepath_to_image(audio_path["path"])
+    item_url = _filepath_to_item_url(audio_path["path"], show["base_url"])
+    attachments = _object_to_attachment(audio_path, show["audio_base_url"])
+    if "image" in audio_path:
+        image = audio_path["image"]
+    else:
+        image = _audio_filepath_to_image(
+            audio_path["path"], show["output_dir"], show["base_url"]
+        )
     item = {
         "id": item_url,
         "url": item_url,
-        "title": _title_from_slug(slug),
+        "title": audio_path.get("title") or _title_from_slug(slug),
         "date_published": date_published,
         "attachments": attachments,
         "image": image,
@@ -163,32 +182,41 @@ def _audio_path_to_json_feed_item(audio_path):
     return item
 
 
-def _json_feed_items_from_audio_paths(audio_paths):
+def _json_feed_items_from_audio_paths(audio_paths, show):
     items = []
     for audio_path in audio_paths:
-        item = _audio_path_to_json_feed_item(audio_path)
+        item = _audio_path_to_json_feed_item(audio_path, show)
         if item:
             items.append(item)
     return sorted(items, key=lambda i: i["date_published"], reverse=True)
 
 
-def build_feed(audio_paths):
-    """create a JSON feed from a list of audio_paths"""
-    items = _json_feed_items_from_audio_paths(audio_paths)
+def build_feed(audio_paths, show: Optional[dict] = None, items=None):
+    """create a JSON feed from a list of audio_paths (or already built, sorted items) for a show"""
+    show = {**DEFAULT_SHOW, **(show or {})}
+    if items is None:
+        items = _json_feed_items_from_audio_paths(audio_paths, show)
     feed = {
         "version": "https://jsonfeed.org/version/1.1",
-        "title": "Radio Rumble",
-        "description": "an irregular DJ show, mostly about house music",
-        "home_page_url": BASE_URL,
-        "feed_url": f"{BASE_URL}/feed.json",
+        "title": show["title"],
+        "description": show["description"],
+        "home_page_url": show["base_url"],
+        "feed_url": f"{show['base_url']}/feed.json",
         "items": items,
-        "icon": f"{BASE_URL}/images/radio-rumble-nyc-logo-1.png",
+        "icon": f"{show['base_url']}/{show['icon']}",
     }
+    if show["hubs"]:
+        feed["hubs"] = [{"type": "WebSub", "url": hub} for hub in show["hubs"]]
     return feed
 
 
-def write_feed(json_feed):
+def feed_to_bytes(json_feed) -> bytes:
+    """serialize a json feed exactly as it is written to feed.json"""
+    return json.dumps(json_feed, indent=2).encode("utf-8")
+
+
+def write_feed(json_feed, output_dir="./public"):
     """write json feed to feed.json"""
-    logger.info("writing feed.json ...")
-    with open("./public/feed.json", "w", encoding="utf-8") as f:
-        f.write(json.dumps(json_feed, indent=2))
+    logger.info("writing %s/feed.json ...", output_dir)
+    with open(f"{output_dir}/feed.json", "wb") as f:
+        f.write(feed_to_bytes(json_feed))
@@ -0,0 +1,175 @@
+"""read and rewrite the atom (box) layout of MP4/m4a files"""
+
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+# atoms we descend into when editing a moov tree; everything else is kept as raw bytes
+CONTAINER_ATOMS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+MAX_UINT32 = 0xFFFFFFFF
+
+
+def _read_header(f, offset, file_size):
+    f.seek(offset)
+    header = f.read(8)
+    if len(header) < 8:
+        return None
+    size, atom_type = struct.unpack(">I4s", header)
+    header_size = 8
+    if size == 1:
+        size = struct.unpack(">Q", f.read(8))[0]
+        header_size = 16
+    elif size == 0:
+        size = file_size - offset
+    return {
+        "type": atom_type,
+        "offset": offset,
+        "size": size,
+        "header_size": header_size,
+    }
+
+
+def read_top_level_atoms(f, file_size) -> list:
+    """
+    Lists the top-level atoms of an MP4 file by seeking from header to header.
+    Args:
+        f: A seekable binary file object.
+        file_size (int): The total size of the file in bytes.
+    Returns:
+        list: dicts with the type, offset, size and header_size of each atom.
+    """
+    atoms = []
+    offset = 0
+    while offset < file_size:
+        atom = _read_header(f, offset, file_size)
+        if not atom or atom["size"] < atom["header_size"]:
+            logger.error("invalid atom at offset %d", offset)
+            break
+        atoms.append(atom)
+        offset += atom["size"]
+    return atoms
+
+
+def find_atom(atoms, atom_type):
+    """return the first atom of a type from a list of atoms, or None"""
+    return next((a for a in atoms if a["type"] == atom_type), None)
+
+
+def parse_atom_tree(data: bytes) -> list:
+    """parse a buffer of sibling atoms, descending into CONTAINER_ATOMS"""
+    atoms = []
+    offset = 0
+    while offset + 8 <= len(data):
+        size, atom_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        payload = data[offset + header_size : offset + size]
+        if atom_type in CONTAINER_ATOMS:
+            atoms.append({"type": atom_type, "children": parse_atom_tree(payload)})
+        else:
+            atoms.append({"type": atom_type, "data": payload})
+        offset += size
+    return atoms
+
+
+def serialize_atom_tree(atoms: list) -> bytes:
+    """turn a list of parsed atoms back into bytes, recomputing sizes"""
+    parts = []
+    for atom in atoms:
+        if "children" in atom:
+            payload = serialize_atom_tree(atom["children"])
+        else:
+            payload = atom["data"]
+        size = 8 + len(payload)
+        if size > MAX_UINT32:
+            parts.append(struct.pack(">I4sQ", 1, atom["type"], size + 8))
+        else:
+            parts.append(struct.pack(">I4s", size, atom["type"]))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def _shift_chunk_offset_atom(atom, shift):
+    version_flags, count = struct.unpack_from(">4sI", atom["data"])
+    fmt = ">%dI" if atom["type"] == b"stco" else ">%dQ"
+    offsets = struct.unpack_from(fmt % count, atom["data"], 8)
+    shifted = [shift(o) for o in offsets]
+    if atom["type"] == b"stco" and any(o > MAX_UINT32 for o in shifted):
+        logger.info("upgrading stco to co64")
+        atom["type"] = b"co64"
+        fmt = ">%dQ"
+    fmt = fmt % count
+    atom["data"] = version_flags + struct.pack(">I", count) + struct.pack(fmt, *shifted)
+
+
+def shift_chunk_offsets(atoms: list, shift):
+    """
+    Rewrites every stco/co64 chunk offset table in a parsed moov tree.
+    Args:
+        atoms (list): A parsed atom tree, as returned by parse_atom_tree.
+        shift (callable): Maps an old absolute file offset to its new one.
+    """
+    for atom in atoms:
+        if "children" in atom:
+            shift_chunk_offsets(atom["children"], shift)
+        elif atom["type"] in (b"stco", b"co64"):
+            _shift_chunk_offset_atom(atom, shift)
+
+
+def _child_payload(data: bytes, atom_type):
+    """the payload of the first child atom of a type in a buffer of siblings"""
+    for atom in parse_atom_tree(data):
+        if atom["type"] == atom_type:
+            if "children" in atom:
+                return serialize_atom_tree(atom["children"])
+            return atom["data"]
+    return None
+
+
+# the type indicator in an ilst data atom
+COVER_TYPES = {13: "jpeg", 14: "png", 27: "bmp"}
+
+
+def find_cover_art(moov_payload: bytes):
+    """
+    Finds the first embedded cover image (moov/udta/meta/ilst/covr/data).
+    Args:
+        moov_payload (bytes): The contents of a moov atom, without its header.
+    Returns:
+        tuple: (image format, image bytes), or None when there is no cover.
+    """
+    payload = moov_payload
+    for atom_type in [b"udta", b"meta", b"ilst", b"covr", b"data"]:
+        if payload is None:
+            return None
+        if atom_type == b"ilst":
+            # meta is a full box: 4 bytes of version and flags before its children
+            payload = payload[4:]
+        payload = _child_payload(payload, atom_type)
+    if not payload or len(payload) <= 8:
+        return None
+    type_indicator = struct.unpack_from(">I", payload)[0] & 0xFFFFFF
+    image_format = COVER_TYPES.get(type_indicator)
+    if not image_format:
+        logger.warning("unknown cover type %d", type_indicator)
+        return None
+    return image_format, payload[8:]
+
+
+def movie_duration(moov_payload: bytes):
+    """the duration in seconds from the mvhd atom, or None"""
+    mvhd = _child_payload(moov_payload, b"mvhd")
+    if not mvhd:
+        return None
+    if mvhd[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", mvhd, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", mvhd, 12)
+    if not timescale:
+        return None
+    return duration / timescale
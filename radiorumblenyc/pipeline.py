@@ -0,0 +1,306 @@
+"""build every configured show's feeds from a single bucket listing"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import hashlib
+import json
+import logging
+from urllib.parse import urlparse
+
+from radiorumblenyc import analytics
+from radiorumblenyc import artwork
+from radiorumblenyc import assets
+from radiorumblenyc import catalog
+from radiorumblenyc import s3
+from radiorumblenyc import websub
+from radiorumblenyc import shows as shows_config
+import radiorumblenyc.jsonfeed as jsonfeed
+import radiorumblenyc.rssfeed as rssfeed
+import radiorumblenyc.htmlgenerator as htmlgenerator
+import radiorumblenyc.searchindex as searchindex
+
+logger = logging.getLogger(__name__)
+
+# bump whenever item rendering changes, so every cached render is redone
+RENDER_VERSION = 2
+
+
+def _render_key(audio_path, show):
+    """a hash of everything an item's render depends on"""
+    inputs = {
+        "version": RENDER_VERSION,
+        "audio_path": audio_path,
+        "show": {
+            name: show[name]
+            for name in ["base_url", "audio_base_url", "output_dir", "player"]
+        },
+        "cards": bool(show["template"]),
+    }
+    encoded = json.dumps(inputs, default=str, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _render_item(audio_path, show):
+    item = jsonfeed._audio_path_to_json_feed_item(audio_path, show)
+    if not item:
+        return {"item": None, "card": None}
+    card = None
+    if show["template"]:
+        card = htmlgenerator._item_card_html(item, show["player"])
+    return {"item": item, "card": card}
+
+
+def _render_items(show, audio_paths, cached):
+    """
+    Renders each item's JSON and card, reusing cached renders.
+    A cached render is reused while its key, etag, last_modified, catalog
+    columns and show settings are unchanged.
+    Args:
+        show (dict): The show being built.
+        audio_paths (list): The catalog's episodes for the show.
+        cached (dict): Keys mapped to (render key, output) from an earlier build.
+    Returns:
+        tuple: every output in audio_paths order, and the freshly rendered ones.
+    """
+    outputs = []
+    rendered = {}
+    for audio_path in audio_paths:
+        key = audio_path["path"]
+        render_key = _render_key(audio_path, show)
+        cached_key, output = cached.get(key, (None, None))
+        if cached_key != render_key:
+            output = _render_item(audio_path, show)
+            rendered[key] = (render_key, output)
+        outputs.append(output)
+    logger.info(
+        "%s: rendered %d items, reused %d",
+        show["name"],
+        len(rendered),
+        len(audio_paths) - len(rendered),
+    )
+    return outputs, rendered
+
+
+def _render_show(show, audio_paths, play_counts, cached):
+    """assemble a show's feeds and page from its item renders"""
+    outputs, rendered = _render_items(show, audio_paths, cached)
+    # the same stable, newest first order jsonfeed.build_feed sorts items into
+    outputs = sorted(
+        (output for output in outputs if output["item"]),
+        key=lambda output: output["item"]["date_published"],
+        reverse=True,
+    )
+    json_feed = jsonfeed.build_feed(
+        [], show=show, items=[output["item"] for output in outputs]
+    )
+    xml_feed = rssfeed.json_feed_to_rss_xml(json_feed)
+    html = None
+    if show["template"]:
+        html = htmlgenerator.json_feed_to_html(
+            json_feed,
+            show["template"],
+            show["player"],
+            play_counts,
+            [output["card"] for output in outputs],
+        )
+    return {"json_feed": json_feed, "rss": xml_feed, "html": html}, rendered
+
+
+def rendered_outputs(build) -> dict:
+    """a build's feeds, page and search index as the exact bytes written or uploaded"""
+    rendered = {
+        "feed.json": jsonfeed.feed_to_bytes(build["json_feed"]),
+        "feed.xml": rssfeed.rss_to_bytes(build["rss"]),
+    }
+    if build["html"] is not None:
+        rendered["index.html"] = build["html"].encode("utf-8")
+    if build.get("search_index") is not None:
+        for filename, payload in searchindex.index_to_bytes(
+            build["search_index"]
+        ).items():
+            rendered[f"{searchindex.SEARCH_DIR}/{filename}"] = payload
+    return rendered
+
+
+def published_build(build) -> dict:
+    """
+    A build with its asset references pointed at their fingerprinted names.
+    The fingerprinted copies only exist in the bucket, so this is applied
+    when publishing and never to what is written to output_dir.
+    Args:
+        build (dict): One show's result from build_show.
+    Returns:
+        dict: the build with rewritten json_feed, rss and html.
+    """
+    show = build["show"]
+    json_feed = assets.rewrite_json_feed(
+        build["json_feed"], build["assets"], show["base_url"]
+    )
+    html = build["html"]
+    if html is not None:
+        html = assets.rewrite_references(html, build["assets"], show["base_url"])
+    return {
+        **build,
+        "json_feed": json_feed,
+        "rss": rssfeed.json_feed_to_rss_xml(json_feed),
+        "html": html,
+    }
+
+
+def _check_incremental(show, audio_paths, play_counts, outputs):
+    """re-render every item from scratch and compare with the incremental build"""
+    full, _rendered = _render_show(show, audio_paths, play_counts, {})
+    incremental_bytes = rendered_outputs(outputs)
+    full_bytes = rendered_outputs(full)
+    differing = [
+        filename
+        for filename in full_bytes
+        if incremental_bytes.get(filename) != full_bytes[filename]
+    ]
+    if differing:
+        raise RuntimeError(
+            f"{show['name']}: incremental build differs from a full build in {differing}"
+        )
+    logger.info("%s: incremental build matches a full build", show["name"])
+
+
+def build_show(
+    show,
+    audio_paths,
+    bucket_name=None,
+    full=False,
+    check=False,
+    write=True,
+    catalog_path=catalog.CATALOG_PATH,
+    rematch_artwork=True,
+):
+    """
+    Renders and writes the JSON, RSS, HTML and search outputs for one show.
+    Args:
+        show (dict): The show to build.
+        audio_paths (list): The show's objects from the bucket listing.
+        bucket_name (str): The bucket, for reading embedded cover art.
+        full (bool): Re-render every item instead of reusing cached renders.
+        check (bool): Fail unless the output matches a full re-render byte for byte.
+        write (bool): Write the outputs to the show's output_dir; they are
+            returned (and published) from memory either way.
+        catalog_path (str): The catalog database to upsert into and cache renders in.
+        rematch_artwork (bool): Re-match every episode's artwork against the images
+            dir; dev mode turns this off after re-matching only the changed images.
+    """
+    logger.info("building %s from %d objects ...", show["name"], len(audio_paths))
+    output_dir = show["output_dir"]
+    play_counts = analytics.load_play_counts() if show["template"] else {}
+    with closing(catalog.connect(catalog_path)) as conn:
+        catalog.upsert_objects(conn, show, audio_paths, rematch_artwork)
+        if bucket_name and show["cover_art"]:
+            artwork.resolve_covers(conn, show, bucket_name)
+        asset_manifest = assets.fingerprint_assets(output_dir)
+        audio_paths = catalog.audio_paths(conn, show["name"], show["max_items"])
+        cached = {} if full else catalog.rendered_items(conn, show["name"])
+        outputs, rendered = _render_show(show, audio_paths, play_counts, cached)
+        catalog.save_rendered_items(
+            conn, show["name"], rendered, [a["path"] for a in audio_paths]
+        )
+    if check:
+        _check_incremental(show, audio_paths, play_counts, outputs)
+    json_feed = outputs["json_feed"]
+    xml_feed = outputs["rss"]
+    html = outputs["html"]
+    search_index = None
+    if html is not None:
+        search_index = searchindex.build_index(json_feed)
+
+    if write:
+        jsonfeed.write_feed(json_feed, output_dir)
+        rssfeed.write_feed(xml_feed, output_dir)
+        if html is not None:
+            htmlgenerator.write_html(html, output_dir)
+            searchindex.write_index(search_index, output_dir)
+        assets.write_manifest(asset_manifest, output_dir)
+    return {
+        "show": show,
+        "json_feed": json_feed,
+        "rss": xml_feed,
+        "html": html,
+        "search_index": search_index,
+        "assets": asset_manifest,
+    }
+
+
+def rebuild_html(build):
+    """re-render just a show's index.html (e.g. after a template edit) from its last build"""
+    show = build["show"]
+    html = htmlgenerator.json_feed_to_html(
+        build["json_feed"],
+        show["template"],
+        show["player"],
+        analytics.load_play_counts(),
+    )
+    htmlgenerator.write_html(html, show["output_dir"])
+    return {**build, "html": html}
+
+
+def build_all(config, current_year_only=False, full=False, check=False, write=True):
+    """list the bucket once (one year prefix per thread) and build every show in parallel"""
+    objects = s3.list_objects_by_year(
+        config["bucket"],
+        [show["prefix"] for show in config["shows"]],
+        current_year_only=current_year_only,
+    )
+    routed = shows_config.route_objects(objects, config["shows"])
+    with ThreadPoolExecutor(max_workers=len(config["shows"])) as pool:
+        futures = [
+            pool.submit(
+                build_show,
+                show,
+                routed[show["name"]],
+                config["bucket"],
+                full,
+                check,
+                write,
+            )
+            for show in config["shows"]
+        ]
+        return [future.result() for future in futures]
+
+
+def _key_prefix(show):
+    """where a show lives in the bucket: the path of its base_url"""
+    path = urlparse(show["base_url"]).path.strip("/")
+    return f"{path}/" if path else ""
+
+
+def _changed_feed_urls(state, show, outputs):
+    changed = []
+    for filename in ["feed.json", "feed.xml"]:
+        feed_url = f"{show['base_url']}/{filename}"
+        if websub.feed_changed(state, feed_url, outputs[filename]):
+            changed.append(feed_url)
+    return changed
+
+
+def publish_all(config, builds):
+    """upload fingerprinted assets first, then the HTML and feeds that reference them"""
+    state = websub.load_state()
+    for build in builds:
+        show = build["show"]
+        key_prefix = _key_prefix(show)
+        outputs = rendered_outputs(published_build(build))
+        s3.sync_assets(
+            config["bucket"], build["assets"], show["output_dir"], key_prefix
+        )
+        s3.upload_outputs(config["bucket"], outputs, key_prefix)
+
+        if not show["hubs"] and not show["ping_urls"]:
+            continue
+        announced = dict(state)
+        changed = _changed_feed_urls(state, show, outputs)
+        if not changed:
+            logger.info("%s feeds unchanged, not notifying", show["name"])
+            continue
+        if not websub.notify(changed, show["hubs"], show["ping_urls"]):
+            # forget the new hashes so the next publish retries the notification
+            state.clear()
+            state.update(announced)
+    websub.save_state(state)
@@ -48,8 +48,9 @@ def _json_feed_item_to_xml_item(json_item):
     guid = ET.SubElement(item, "guid")
     guid.text = json_item["id"]
     guid.attrib["isPermaLink"] = "false"
-    itunes_image = ET.SubElement(item, "itunes:image")
-    itunes_image.attrib["href"] = json_item["image"]
+    if json_item["image"]:
+        itunes_image = ET.SubElement(item, "itunes:image")
+        itunes_image.attrib["href"] = json_item["image"]
     for att in json_item["attachments"]:
         enclosure = ET.SubElement(item, "enclosure")
         enclosure.attrib["url"] = att["url"]
@@ -58,6 +59,9 @@ def _json_feed_item_to_xml_item(json_item):
         media_content = ET.SubElement(item, "media:content")
         media_content.attrib["url"] = att["url"]
         media_content.attrib["type"] = att["mime_type"]
+        if "duration_in_seconds" in att:
+            itunes_duration = ET.SubElement(item, "itunes:duration")
+            itunes_duration.text = str(att["duration_in_seconds"])
 
     return item
 
@@ -72,9 +76,13 @@ def _json_feed_to_rss_channel(json_feed):
     link = ET.SubElement(channel, "link")
     link.text = json_feed["home_page_url"]
     atom_link = ET.SubElement(channel, "atom:link")
-    atom_link.attrib["href"] = "https://radio.rumble.nyc/feed.xml"
+    atom_link.attrib["href"] = f"{json_feed['home_page_url']}/feed.xml"
     atom_link.attrib["rel"] = "self"
     atom_link.attrib["type"] = "application/rss+xml"
+    for hub in json_feed.get("hubs", []):
+        hub_link = ET.SubElement(channel, "atom:link")
+        hub_link.attrib["href"] = hub["url"]
+        hub_link.attrib["rel"] = "hub"
 
     itunes_image = ET.SubElement(channel, "itunes:image")
     itunes_image.attrib["href"] = json_feed["icon"]
@@ -84,7 +92,12 @@ def _json_feed_to_rss_channel(json_feed):
     return channel
 
 
-def write_feed(rss_feed: ET.Element):
+def rss_to_bytes(rss_feed: ET.Element) -> bytes:
+    """serialize an ET.Element object exactly as it is written to feed.xml"""
+    return ET.tostring(rss_feed, encoding="utf-8")
+
+
+def write_feed(rss_feed: ET.Element, output_dir="./public"):
     """write an ET.Element object to feed.xml"""
-    logger.info("writing feed.xml ...")
-    ET.ElementTree(rss_feed).write("./public/feed.xml", encoding="utf-8")
+    logger.info("writing %s/feed.xml ...", output_dir)
+    ET.ElementTree(rss_feed).write(f"{output_dir}/feed.xml", encoding="utf-8")
@@ -1,12 +1,32 @@
 """crawls an S3 bucket for audio files and returns a list of the paths"""
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import gzip
+import hashlib
+import io
+import json
 import logging
 import os
+import re
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 
 logger = logging.getLogger(__name__)
 
+PUBLIC_DIR = "./public"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+UPLOAD_WORKERS = 8
+# payloads above this go up in parts (B2 requires parts of at least 5 MB)
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+# outputs at least this big also get a gzipped "<key>.gz" sibling
+MIN_GZIP_BYTES = 1024
+LIST_WORKERS = 8
+LISTING_SNAPSHOT_PATH = "./.build/listing-snapshot.json"
+
 
 def _filename_to_content_type(filename):
     ext = os.path.splitext(filename)[1].lower()
@@ -43,6 +63,7 @@ def _s3_object_to_dict(obj):
         "path": obj.key,
         "content_length": obj.size,
         "last_modified": obj.last_modified,
+        "etag": obj.e_tag,
     }
 
 
@@ -66,20 +87,271 @@ def get_audio_from_s3(bucket_name):
     return list(map(_s3_object_to_dict, objects))
 
 
+def _listing_entry_to_dict(entry):
+    return {
+        "path": entry["Key"],
+        "content_length": entry["Size"],
+        "last_modified": entry["LastModified"],
+        "etag": entry["ETag"],
+    }
+
+
+def _list_level(client, bucket_name, prefix):
+    """one delimiter listing of a prefix: (objects directly in it, sub-prefixes)"""
+    objects = []
+    sub_prefixes = []
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter="/"):
+        objects += [_listing_entry_to_dict(e) for e in page.get("Contents", [])]
+        sub_prefixes += [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+    return objects, sub_prefixes
+
+
+def _list_all(client, bucket_name, prefix):
+    objects = []
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        objects += [_listing_entry_to_dict(e) for e in page.get("Contents", [])]
+    logger.info("listed %d objects under %s", len(objects), prefix)
+    return objects
+
+
+def _load_listing_snapshot(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return {}
+    for objects in snapshot.values():
+        for obj in objects:
+            obj["last_modified"] = datetime.fromisoformat(obj["last_modified"])
+    return snapshot
+
+
+def _save_listing_snapshot(snapshot, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    serializable = {
+        prefix: [{**o, "last_modified": o["last_modified"].isoformat()} for o in objs]
+        for prefix, objs in snapshot.items()
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(serializable, sort_keys=True))
+
+
+def _is_past_year_prefix(prefix):
+    match = re.search(r"/(\d{4})/$", prefix)
+    return bool(match) and int(match.group(1)) < datetime.now().year
+
+
+def list_objects_by_year(
+    bucket_name,
+    prefixes,
+    current_year_only=False,
+    snapshot_path=LISTING_SNAPSHOT_PATH,
+):
+    """
+    Lists audio/<year>/ style prefixes concurrently instead of in one stream.
+    A delimiter call per prefix discovers its year sub-prefixes, which are then
+    listed in parallel and merged, so latency follows the largest year.
+    Args:
+        bucket_name (str): The bucket to list.
+        prefixes (list): Top-level prefixes to discover year sub-prefixes under.
+        current_year_only (bool): Reuse past years from the cached snapshot
+            instead of relisting them.
+        snapshot_path (str): Where the last listing of each sub-prefix is kept.
+    Returns:
+        list: object dicts with path, content_length, last_modified and etag.
+    """
+    client = _get_s3_resource().meta.client
+    snapshot = _load_listing_snapshot(snapshot_path)
+    objects = []
+    to_list = []
+    with ThreadPoolExecutor(max_workers=LIST_WORKERS) as pool:
+        levels = pool.map(lambda p: _list_level(client, bucket_name, p), prefixes)
+        for level_objects, sub_prefixes in levels:
+            objects += level_objects
+            for sub_prefix in sub_prefixes:
+                cached = snapshot.get(sub_prefix)
+                if current_year_only and cached and _is_past_year_prefix(sub_prefix):
+                    logger.info("using cached listing of %s", sub_prefix)
+                    objects += cached
+                else:
+                    to_list.append(sub_prefix)
+
+        listings = pool.map(lambda p: _list_all(client, bucket_name, p), to_list)
+        for sub_prefix, listed in zip(to_list, listings):
+            snapshot[sub_prefix] = listed
+            objects += listed
+
+    _save_listing_snapshot(snapshot, snapshot_path)
+    objects = [o for o in objects if ".bzEmpty" not in o["path"]]
+    logger.info("listed %d objects in %s", len(objects), bucket_name)
+    return objects
+
+
 def _local_filepath_to_s3_filepath(filepath):
-    """convert a local filepath to an s3 filepath"""
-    if filepath.startswith("./"):
-        filepath = filepath[2:]
-    return filepath.replace("./public/", "")
+    """convert a local filepath under ./public to an s3 filepath"""
+    return os.path.relpath(filepath, PUBLIC_DIR).replace(os.sep, "/")
 
 
-def sync_web(bucket_name):
-    """send web elements to s3"""
-    local_filepaths = ["./public/index.html", "./public/feed.json", "./public/feed.xml"]
-    resource = _get_s3_resource()
-    for local_filepath in local_filepaths:
-        filepath = _local_filepath_to_s3_filepath(local_filepath)
-        obj = resource.Object(bucket_name, filepath)
-        content_type = _filename_to_content_type(filepath)
-        logger.info("uploading %s  %s ...", content_type, filepath)
-        obj.upload_file(filepath, ExtraArgs={"ContentType": content_type})
+def upload_outputs(bucket_name, outputs, key_prefix="", max_workers=UPLOAD_WORKERS):
+    """
+    Uploads rendered HTML, feeds and search index straight from memory.
+    Each output big enough to benefit also gets a gzipped "<key>.gz" sibling
+    with Content-Encoding: gzip, for a CDN or edge rule to serve.
+    Args:
+        bucket_name (str): The bucket to upload to.
+        outputs (dict): Paths relative to the show mapped to their bytes.
+        key_prefix (str): The show's key prefix, e.g. "" or "ttt/".
+        max_workers (int): The most uploads in flight at once.
+    Returns:
+        list: the uploaded keys.
+    """
+    client = _get_s3_resource().meta.client
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        use_threads=False,
+    )
+    uploads = []
+    for relpath, body in sorted(outputs.items()):
+        extra_args = {
+            "ContentType": _filename_to_content_type(relpath),
+            "CacheControl": REVALIDATE_CACHE_CONTROL,
+        }
+        uploads.append((f"{key_prefix}{relpath}", body, extra_args))
+        if len(body) >= MIN_GZIP_BYTES:
+            uploads.append(
+                (
+                    f"{key_prefix}{relpath}.gz",
+                    gzip.compress(body, compresslevel=9, mtime=0),
+                    {**extra_args, "ContentEncoding": "gzip"},
+                )
+            )
+
+    def _upload(upload):
+        key, body, extra_args = upload
+        logger.info(
+            "uploading %s  %s (%d bytes) ...", extra_args["ContentType"], key, len(body)
+        )
+        client.upload_fileobj(
+            io.BytesIO(body),
+            bucket_name,
+            key,
+            ExtraArgs=extra_args,
+            Config=transfer_config,
+        )
+        return key
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_upload, uploads))
+
+
+def _upload_files(bucket_name, uploads, max_workers=UPLOAD_WORKERS):
+    """upload (local_filepath, key, extra_args) tuples concurrently"""
+    client = _get_s3_resource().meta.client
+
+    def _upload(upload):
+        local_filepath, key, extra_args = upload
+        logger.info("uploading %s  %s ...", extra_args["ContentType"], key)
+        client.upload_file(local_filepath, bucket_name, key, ExtraArgs=extra_args)
+        return key
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_upload, uploads))
+
+
+def _list_prefix(bucket_name, prefix):
+    """list a key prefix once into key -> {size, etag}"""
+    bucket = _get_s3_resource().Bucket(bucket_name)
+    return {
+        o.key: {"size": o.size, "etag": o.e_tag.strip('"')}
+        for o in bucket.objects.filter(Prefix=prefix)
+    }
+
+
+def sync_assets(bucket_name, manifest, output_dir=PUBLIC_DIR, key_prefix=None):
+    """upload fingerprinted assets that are not in s3 yet as immutable objects"""
+    if key_prefix is None:
+        key_prefix = _local_filepath_to_s3_filepath(output_dir)
+        key_prefix = "" if key_prefix == "." else f"{key_prefix}/"
+    existing = {}
+    for asset_dir in {p.split("/", 1)[0] for p in manifest.values()}:
+        existing.update(_list_prefix(bucket_name, f"{key_prefix}{asset_dir}/"))
+
+    uploads = [
+        (
+            f"{output_dir}/{relpath}",
+            f"{key_prefix}{fingerprinted}",
+            {
+                "ContentType": _filename_to_content_type(relpath),
+                "CacheControl": IMMUTABLE_CACHE_CONTROL,
+            },
+        )
+        for relpath, fingerprinted in sorted(manifest.items())
+        if f"{key_prefix}{fingerprinted}" not in existing
+    ]
+    _upload_files(bucket_name, uploads)
+
+
+def _file_md5(filepath):
+    with open(filepath, "rb") as f:
+        return hashlib.file_digest(f, "md5").hexdigest()
+
+
+def _local_files(local_dir):
+    local_filepaths = {}
+    for dir_name, _dirs, files in os.walk(local_dir):
+        for filename in files:
+            local_filepath = f"{dir_name}/{filename}"
+            relpath = os.path.relpath(local_filepath, local_dir).replace(os.sep, "/")
+            local_filepaths[relpath] = local_filepath
+    return local_filepaths
+
+
+def _needs_upload(local_filepath, md5, remote):
+    if remote is None:
+        return True
+    if os.path.getsize(local_filepath) != remote["size"]:
+        return True
+    # multipart ETags are not an MD5 of the content, so size is all we can compare
+    if "-" in remote["etag"]:
+        return False
+    return md5 != remote["etag"]
+
+
+def sync_images(bucket_name, local_dir="./public/images", prefix="images/"):
+    """
+    Uploads new or changed images after a single listing of the images prefix.
+    Local files are hashed in parallel and compared to the listing by key, size
+    and ETag (the MD5 of single-part uploads); differing files are uploaded
+    concurrently. Remote keys with no local file are only reported.
+    Returns:
+        dict: the keys uploaded, unchanged and that would be deleted.
+    """
+    remote = _list_prefix(bucket_name, prefix)
+    local_filepaths = _local_files(local_dir)
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        md5s = dict(zip(local_filepaths, pool.map(_file_md5, local_filepaths.values())))
+
+    uploads = []
+    unchanged = []
+    for relpath, local_filepath in sorted(local_filepaths.items()):
+        key = f"{prefix}{relpath}"
+        if not _needs_upload(local_filepath, md5s[relpath], remote.get(key)):
+            unchanged.append(key)
+            continue
+        content_type = _filename_to_content_type(relpath)
+        uploads.append((local_filepath, key, {"ContentType": content_type}))
+
+    would_delete = sorted(set(remote) - {f"{prefix}{p}" for p in local_filepaths})
+    for key in would_delete:
+        logger.info("would delete %s (no local file)", key)
+    uploaded = _upload_files(bucket_name, uploads)
+    logger.info(
+        "synced images: %d uploaded %d unchanged %d would delete",
+        len(uploaded),
+        len(unchanged),
+        len(would_delete),
+    )
+    return {"uploaded": uploaded, "unchanged": unchanged, "would_delete": would_delete}
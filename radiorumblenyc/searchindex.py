@@ -0,0 +1,120 @@
+"""build a precomputed client-side search index from a JSON Feed dictionary"""
+
+import json
+import logging
+import os
+import re
+from datetime import datetime
+
+from radiorumblenyc import jsonfeed
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DIR = "search"
+MANIFEST_FILENAME = "index.json"
+# split into one shard per leading character once the index gets this big
+SHARD_THRESHOLD = 4000
+UNSHARDED_KEY = "_"
+
+
+def _tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _item_slug(item):
+    return item["id"].rstrip("/").rsplit("/", 1)[-1]
+
+
+def _item_tokens(item):
+    slug = _item_slug(item)
+    tokens = set(_tokenize(item["title"]))
+    tokens.update(_tokenize(slug))
+
+    episode_number = jsonfeed._filepath_to_episode_number(slug)
+    if episode_number:
+        tokens.add(str(episode_number))
+        tokens.add(f"ep{episode_number}")
+        tokens.add(f"episode{episode_number}")
+
+    published = datetime.fromisoformat(item["date_published"])
+    tokens.add(published.strftime("%Y"))
+    tokens.add(published.strftime("%Y%m%d"))
+    tokens.add(published.strftime("%B").lower())
+    return tokens
+
+
+def _prefixes(token):
+    return [token[:i] for i in range(1, len(token) + 1)]
+
+
+def _build_postings(items):
+    postings = {}
+    for doc_id, item in enumerate(items):
+        for token in _item_tokens(item):
+            for prefix in _prefixes(token):
+                postings.setdefault(prefix, set()).add(doc_id)
+    return {prefix: sorted(docs) for prefix, docs in sorted(postings.items())}
+
+
+def _shard_postings(postings):
+    if len(postings) <= SHARD_THRESHOLD:
+        return {UNSHARDED_KEY: postings}
+    shards = {}
+    for prefix, docs in postings.items():
+        shards.setdefault(prefix[0], {})[prefix] = docs
+    return shards
+
+
+def _shard_filename(shard_key):
+    return f"index-{shard_key}.json"
+
+
+def build_index(json_feed: dict) -> dict:
+    """
+    Builds an inverted prefix index over the items in a JSON feed.
+    Args:
+        json_feed (dict): The JSON feed data to be indexed.
+    Returns:
+        dict: filenames relative to the search directory mapped to their JSON payloads.
+    """
+    items = json_feed["items"]
+    postings = _build_postings(items)
+    shards = _shard_postings(postings)
+    logger.info(
+        "search index: %d docs %d keys %d shards",
+        len(items),
+        len(postings),
+        len(shards),
+    )
+
+    manifest = {
+        "version": 1,
+        "sharded": UNSHARDED_KEY not in shards,
+        "docs": [item["id"] for item in items],
+        "shards": {key: _shard_filename(key) for key in shards},
+    }
+    index = {MANIFEST_FILENAME: manifest}
+    for key, shard in shards.items():
+        index[_shard_filename(key)] = shard
+    return index
+
+
+def index_to_bytes(index: dict) -> dict:
+    """serialize each search manifest and shard to compact JSON bytes"""
+    return {
+        filename: json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        for filename, payload in index.items()
+    }
+
+
+def write_index(index: dict, output_dir="./public"):
+    """write the search manifest and shards to the search directory"""
+    logger.info("writing search index ...")
+    search_dir = os.path.join(output_dir, SEARCH_DIR)
+    os.makedirs(search_dir, exist_ok=True)
+    for existing in os.listdir(search_dir):
+        if existing not in index:
+            os.remove(os.path.join(search_dir, existing))
+    for filename, payload in index_to_bytes(index).items():
+        with open(os.path.join(search_dir, filename), "wb") as f:
+            f.write(payload)
@@ -0,0 +1,350 @@
+"""an asyncio HTTP server for previewing (or originating) the built feeds from memory"""
+
+import asyncio
+import email.utils
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import signal
+import time
+from urllib.parse import unquote, urlparse
+
+from radiorumblenyc import pipeline
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_DIR = "./public"
+AUDIO_DIR = "./audio"
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+KEEP_ALIVE_SECONDS = 15
+# don't bother compressing bodies smaller than this
+MIN_GZIP_BYTES = 1024
+
+REASONS = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+}
+
+
+def _content_type(path):
+    if path.endswith(".json"):
+        return "application/json"
+    if path.endswith(".xml"):
+        return "application/rss+xml"
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def _memory_resource(path, body, last_modified):
+    resource = {
+        "body": body,
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:16]}"',
+        "last_modified": last_modified,
+        "content_type": _content_type(path),
+        "gzip": None,
+    }
+    if len(body) >= MIN_GZIP_BYTES:
+        resource["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+    return resource
+
+
+def _show_path(show):
+    return urlparse(show["base_url"]).path.rstrip("/")
+
+
+def build_site(builds) -> dict:
+    """
+    Renders the outputs of pipeline.build_all into an immutable site snapshot.
+    Args:
+        builds (list): The per-show results of pipeline.build_all.
+    Returns:
+        dict: request paths mapped to in-memory resources, plus the asset
+            paths that map fingerprinted names back to files on disk.
+    """
+    last_modified = int(time.time())
+    resources = {}
+    assets = {}
+    for build in builds:
+        show_path = _show_path(build["show"])
+        for relpath, body in pipeline.rendered_outputs(build).items():
+            path = f"{show_path}/{relpath}"
+            resources[path] = _memory_resource(path, body, last_modified)
+        for relpath, fingerprinted in build["assets"].items():
+            assets[f"{show_path}/{fingerprinted}"] = os.path.join(
+                build["show"]["output_dir"], relpath
+            )
+    logger.info("built site snapshot with %d resources", len(resources))
+    return {"resources": resources, "assets": assets}
+
+
+def _parse_range(value, size):
+    """a single 'bytes=' range as (start, end) inclusive, None if absent, or False"""
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    start, _, end = value[len("bytes=") :].strip().partition("-")
+    try:
+        if not start:
+            length = int(end)
+            if length == 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _not_modified(headers, etag, last_modified):
+    if "if-none-match" in headers:
+        tags = [t.strip() for t in headers["if-none-match"].split(",")]
+        return etag in tags or "*" in tags
+    if "if-modified-since" in headers:
+        try:
+            since = email.utils.parsedate_to_datetime(headers["if-modified-since"])
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= since.timestamp()
+    return False
+
+
+class FeedServer:
+    """serves a site snapshot that can be swapped without dropping connections"""
+
+    def __init__(self, site, public_dir=PUBLIC_DIR, audio_dir=AUDIO_DIR):
+        self.site = site
+        self.public_dir = public_dir
+        self.audio_dir = audio_dir
+
+    def swap(self, site):
+        """atomically replace the snapshot; in-flight requests keep the old one"""
+        previous = self.site["resources"]
+        for path, resource in site["resources"].items():
+            # unchanged bytes keep their Last-Modified, so If-Modified-Since still 304s
+            if path in previous and previous[path]["etag"] == resource["etag"]:
+                resource["last_modified"] = previous[path]["last_modified"]
+        self.site = site
+        logger.info("swapped in new site snapshot")
+
+    def _local_file(self, site, path):
+        if path in site["assets"]:
+            return site["assets"][path]
+        relpath = os.path.normpath(path.lstrip("/"))
+        if relpath.startswith(".."):
+            return None
+        if relpath.startswith("audio/"):
+            filepath = os.path.join(self.audio_dir, relpath[len("audio/") :])
+        else:
+            filepath = os.path.join(self.public_dir, relpath)
+        return filepath if os.path.isfile(filepath) else None
+
+    def _write_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _respond_memory(self, writer, method, headers, resource):
+        response_headers = {
+            "Content-Type": resource["content_type"],
+            "Last-Modified": email.utils.formatdate(
+                resource["last_modified"], usegmt=True
+            ),
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+            "Accept-Ranges": "bytes",
+        }
+        body = resource["body"]
+        etag = resource["etag"]
+        use_gzip = (
+            resource["gzip"] is not None
+            and "gzip" in headers.get("accept-encoding", "")
+            and "range" not in headers
+        )
+        if use_gzip:
+            body = resource["gzip"]
+            etag = f'{etag[:-1]}-gz"'
+            response_headers["Content-Encoding"] = "gzip"
+        response_headers["ETag"] = etag
+
+        if _not_modified(headers, etag, resource["last_modified"]):
+            self._write_head(writer, 304, response_headers)
+            return
+        status = 200
+        byte_range = _parse_range(headers.get("range"), len(body))
+        if byte_range is False:
+            response_headers["Content-Range"] = f"bytes */{len(body)}"
+            response_headers["Content-Length"] = "0"
+            self._write_head(writer, 416, response_headers)
+            return
+        if byte_range:
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            body = body[start : end + 1]
+            status = 206
+        response_headers["Content-Length"] = str(len(body))
+        self._write_head(writer, status, response_headers)
+        if method == "GET":
+            writer.write(body)
+
+    async def _respond_file(self, writer, method, headers, filepath):
+        accepts_gzip = "gzip" in headers.get("accept-encoding", "")
+        response_headers = {"Content-Type": _content_type(filepath)}
+        gzip_path = f"{filepath}.gz"
+        if accepts_gzip and "range" not in headers and os.path.isfile(gzip_path):
+            filepath = gzip_path
+            response_headers["Content-Encoding"] = "gzip"
+            response_headers["Vary"] = "Accept-Encoding"
+        stat = os.stat(filepath)
+        size = stat.st_size
+        etag = f'"{int(stat.st_mtime)}-{size}"'
+        response_headers.update(
+            {
+                "ETag": etag,
+                "Last-Modified": email.utils.formatdate(stat.st_mtime, usegmt=True),
+                "Accept-Ranges": "bytes",
+            }
+        )
+        if _not_modified(headers, etag, int(stat.st_mtime)):
+            self._write_head(writer, 304, response_headers)
+            return
+
+        status = 200
+        start, end = 0, size - 1
+        byte_range = _parse_range(headers.get("range"), size)
+        if byte_range is False:
+            response_headers["Content-Range"] = f"bytes */{size}"
+            response_headers["Content-Length"] = "0"
+            self._write_head(writer, 416, response_headers)
+            return
+        if byte_range:
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            status = 206
+        response_headers["Content-Length"] = str(end - start + 1)
+        self._write_head(writer, status, response_headers)
+        if method != "GET":
+            return
+        with open(filepath, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                writer.write(chunk)
+                remaining -= len(chunk)
+                await writer.drain()
+
+    async def _respond_error(self, writer, status):
+        body = f"{status} {REASONS[status]}\n".encode("utf-8")
+        self._write_head(
+            writer,
+            status,
+            {"Content-Type": "text/plain", "Content-Length": str(len(body))},
+        )
+        writer.write(body)
+
+    async def _handle_request(self, writer, method, target, headers):
+        site = self.site
+        path = unquote(urlparse(target).path)
+        if path.endswith("/"):
+            path = f"{path}index.html"
+        logger.info("%s %s", method, path)
+        if method not in ("GET", "HEAD"):
+            await self._respond_error(writer, 405)
+            return
+        if path in site["resources"]:
+            await self._respond_memory(writer, method, headers, site["resources"][path])
+            return
+        filepath = self._local_file(site, path)
+        if filepath:
+            await self._respond_file(writer, method, headers, filepath)
+            return
+        await self._respond_error(writer, 404)
+
+    async def handle_connection(self, reader, writer):
+        """serve keep-alive HTTP/1.1 requests on one connection"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_SECONDS
+                    )
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    asyncio.TimeoutError,
+                ):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    await self._respond_error(writer, 400)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                await self._handle_request(writer, method, target, headers)
+                await writer.drain()
+                if (
+                    version != "HTTP/1.1"
+                    or headers.get("connection", "").lower() == "close"
+                ):
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+
+async def serve(site, rebuild, host="127.0.0.1", port=8000, rebuild_interval=None):
+    """
+    Serves a site snapshot, rebuilding it on SIGHUP or every rebuild_interval seconds.
+    Args:
+        site (dict): The initial snapshot from build_site.
+        rebuild (callable): Blocking function returning a new snapshot.
+        host (str): The interface to listen on.
+        port (int): The port to listen on.
+        rebuild_interval (int): Optional seconds between rebuilds.
+    """
+    feed_server = FeedServer(site)
+    rebuilding = asyncio.Lock()
+
+    async def _rebuild():
+        if rebuilding.locked():
+            return
+        async with rebuilding:
+            try:
+                feed_server.swap(await asyncio.to_thread(rebuild))
+            except Exception:
+                logger.exception("rebuild failed, still serving the old snapshot")
+
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGHUP, lambda: loop.create_task(_rebuild()))
+    except (AttributeError, NotImplementedError, RuntimeError):
+        # no SIGHUP on Windows, and signals only reach the main thread
+        logger.info("SIGHUP rebuilds unavailable")
+
+    server = await asyncio.start_server(
+        feed_server.handle_connection, host, port, limit=MAX_HEADER_BYTES
+    )
+    logger.info("serving on http://%s:%d/", host, port)
+    async with server:
+        if not rebuild_interval:
+            await server.serve_forever()
+        while True:
+            await asyncio.sleep(rebuild_interval)
+            await _rebuild()
@@ -0,0 +1,45 @@
+"""load show definitions and route bucket objects to the show they belong to"""
+
+import logging
+import tomllib
+
+from radiorumblenyc import jsonfeed
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "./shows.toml"
+
+
+def _show_from_config(name, show_config):
+    show = {
+        **jsonfeed.DEFAULT_SHOW,
+        "name": name,
+        "template": None,
+        "max_items": None,
+        "player": "lazy",
+        "cover_art": True,
+        "ping_urls": [],
+    }
+    show.update(show_config)
+    return show
+
+
+def load_config(path=CONFIG_PATH) -> dict:
+    """read the shows config file into a bucket name and a list of show dicts"""
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    shows = [_show_from_config(name, c) for name, c in config["shows"].items()]
+    logger.info("loaded %d shows from %s", len(shows), path)
+    return {"bucket": config["bucket"], "shows": shows}
+
+
+def route_objects(objects, shows) -> dict:
+    """group listed objects by show name, using the longest matching prefix"""
+    by_longest_prefix = sorted(shows, key=lambda s: len(s["prefix"]), reverse=True)
+    routed = {show["name"]: [] for show in shows}
+    for obj in objects:
+        for show in by_longest_prefix:
+            if obj["path"].startswith(show["prefix"]):
+                routed[show["name"]].append(obj)
+                break
+    return routed
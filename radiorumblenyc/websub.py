@@ -0,0 +1,160 @@
+"""notify WebSub hubs and ping endpoints when a published feed actually changes"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = "./.build/published-feeds.json"
+MAX_WORKERS = 4
+RETRIES = 3
+BACKOFF_SECONDS = 1.0
+TIMEOUT_SECONDS = 10
+
+
+def load_state(path=STATE_PATH) -> dict:
+    """feed URLs mapped to the sha256 of the content last announced"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state: dict, path=STATE_PATH):
+    """persist the announced feed hashes"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(state, indent=2, sort_keys=True))
+
+
+def feed_changed(state: dict, feed_url: str, content: bytes) -> bool:
+    """compare feed content with the last announced version and record it"""
+    digest = hashlib.sha256(content).hexdigest()
+    if state.get(feed_url) == digest:
+        return False
+    state[feed_url] = digest
+    return True
+
+
+def _request(url, data=None):
+    request = urllib.request.Request(url, data=data, method="POST" if data else "GET")
+    request.add_header("User-Agent", "radio.rumble.nyc feed builder")
+    with urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS) as response:
+        return response.status
+
+
+def _request_with_retries(url, data=None) -> bool:
+    for attempt in range(1, RETRIES + 1):
+        try:
+            status = _request(url, data)
+            logger.info("notified %s (%d)", url, status)
+            return True
+        except urllib.error.HTTPError as e:
+            # a hub rejecting the request will not change its mind
+            if 400 <= e.code < 500 and e.code != 429:
+                logger.error("%s rejected notification: %d", url, e.code)
+                return False
+            logger.warning("attempt %d to notify %s failed: %s", attempt, url, e)
+        except (OSError, http.client.HTTPException) as e:
+            # URLError, timeouts, resets and hubs hanging up without a reply
+            logger.warning("attempt %d to notify %s failed: %s", attempt, url, e)
+        if attempt < RETRIES:
+            time.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return False
+
+
+def _hub_publish(hub, feed_url):
+    data = urllib.parse.urlencode({"hub.mode": "publish", "hub.url": feed_url})
+    return _request_with_retries(hub, data.encode("utf-8"))
+
+
+def _ping(ping_url, feed_url):
+    url = ping_url.format(feed_url=urllib.parse.quote(feed_url, safe=""))
+    return _request_with_retries(url)
+
+
+def notify(feed_urls, hubs, ping_urls, max_workers=MAX_WORKERS) -> bool:
+    """
+    Announces changed feeds to every hub (WebSub publish) and ping endpoint.
+    Args:
+        feed_urls (list): The feed URLs that changed.
+        hubs (list): WebSub hub URLs.
+        ping_urls (list): GET endpoints with a {feed_url} placeholder,
+            e.g. Podcast Index's pubnotify.
+        max_workers (int): The most notifications in flight at once.
+    Returns:
+        bool: True when every notification was accepted.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(_hub_publish, hub, feed_url)
+            for feed_url in feed_urls
+            for hub in hubs
+        ]
+        futures += [
+            pool.submit(_ping, ping_url, feed_url)
+            for feed_url in feed_urls
+            for ping_url in ping_urls
+        ]
+        return all(future.result() for future in futures)
+
+
+class _StubHubHandler(BaseHTTPRequestHandler):
+    def _record(self, body):
+        self.server.received.append(
+            {"method": self.command, "path": self.path, "body": body}
+        )
+        logger.info("stub hub received %s %s %s", self.command, self.path, body)
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def do_GET(self):
+        self._record(None)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        self._record(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class StubHub(ThreadingHTTPServer):
+    """a local hub that accepts and records publish notifications, for testing"""
+
+    def __init__(self, port=0, status=204):
+        super().__init__(("127.0.0.1", port), _StubHubHandler)
+        self.received = []
+        self.status = status
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+def main(argv=None):
+    """python -m radiorumblenyc.websub --port 8081"""
+    logging.basicConfig(stream=sys.stdout, level="INFO")
+    parser = argparse.ArgumentParser(description="run a local stub WebSub hub")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args(argv)
+    hub = StubHub(args.port)
+    logger.info("stub hub listening on %s", hub.url)
+    hub.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
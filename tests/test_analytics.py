@@ -0,0 +1,56 @@
+"""attribute access log requests to the right show's episodes"""
+
+from radiorumblenyc import analytics
+from radiorumblenyc import shows
+
+B2 = "https://f002.backblazeb2.com/file/rumble-nyc-radio"
+SHOWS = [
+    shows._show_from_config("radio-rumble", {}),
+    shows._show_from_config(
+        "ttt", {"prefix": "ttt/audio/", "audio_base_url": f"{B2}/ttt"}
+    ),
+]
+
+
+def _line(ip, path, sent=2_000_000):
+    return (
+        f'{ip} - - [16/Aug/2025:16:55:40 +0000] "GET {path} HTTP/1.1" 200 {sent} '
+        '"-" "Overcast/3.0"\n'
+    )
+
+
+def test_plays_are_counted_under_each_shows_enclosure_url(tmp_path):
+    log = tmp_path / "access.log"
+    log.write_text(
+        _line("10.0.0.1", "/file/rumble-nyc-radio/ttt/audio/2025/ep.m4a")
+        + _line("10.0.0.2", "/file/rumble-nyc-radio/ttt/audio/2025/ep.m4a")
+        + _line("10.0.0.1", "/file/rumble-nyc-radio/audio/2025/ep.m4a")
+        + _line("10.0.0.3", "/audio/2025/ep.m4a?download=1")
+    )
+    episodes = analytics.count_plays([str(log)], SHOWS)
+    assert {url: counters["plays"] for url, counters in episodes.items()} == {
+        f"{B2}/ttt/audio/2025/ep.m4a": 2,
+        f"{B2}/audio/2025/ep.m4a": 2,
+    }
+
+
+def test_non_audio_paths_are_ignored():
+    show_order = sorted(SHOWS, key=lambda s: len(s["prefix"]), reverse=True)
+    assert (
+        analytics._path_to_enclosure_url(b"/audio/2025/cover.png", show_order) is None
+    )
+    assert analytics._path_to_enclosure_url(b"/index.html", show_order) is None
+
+
+def test_malformed_timestamps_skip_only_their_line(tmp_path, caplog):
+    path = "/audio/2025/ep.m4a"
+    log = tmp_path / "access.log"
+    log.write_text(
+        _line("10.0.0.1", path)
+        + _line("10.0.0.2", path).replace("16/Aug/2025:16:55:40 +0000", "garbage")
+        + _line("10.0.0.3", path).replace("/Aug/", "/Foo/")
+        + _line("10.0.0.4", path)
+    )
+    episodes = analytics.count_plays([str(log)], SHOWS)
+    assert episodes[f"{B2}/audio/2025/ep.m4a"]["plays"] == 2
+    assert "skipped 2 unparseable lines" in caplog.text
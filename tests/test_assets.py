@@ -0,0 +1,21 @@
+"""fingerprinting of a show's static assets"""
+
+from radiorumblenyc import assets
+
+
+def test_covers_keep_their_content_hashed_names(tmp_path):
+    (tmp_path / "images" / "covers").mkdir(parents=True)
+    (tmp_path / "images" / "logo.png").write_bytes(b"logo")
+    (tmp_path / "images" / "covers" / "0123456789abcdef.jpg").write_bytes(b"cover")
+
+    manifest = assets.fingerprint_assets(str(tmp_path))
+
+    cover = "images/covers/0123456789abcdef.jpg"
+    assert manifest[cover] == cover
+    assert manifest["images/logo.png"].startswith("images/logo.")
+    assert manifest["images/logo.png"] != "images/logo.png"
+    base_url = "https://radio.example"
+    assert (
+        assets.rewrite_references(f'<img src="{base_url}/{cover}">', manifest, base_url)
+        == f'<img src="{base_url}/{cover}">'
+    )
@@ -0,0 +1,105 @@
+"""faststart rewriting of MP4 files"""
+
+import io
+import random
+import struct
+
+import pytest
+
+from radiorumblenyc import audiofiles
+from radiorumblenyc import mp4atoms
+
+
+def _atom(atom_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), atom_type) + payload
+
+
+def _chunk_offset_table(atom_type, offsets):
+    fmt = ">%dI" if atom_type == b"stco" else ">%dQ"
+    table = struct.pack(">4sI", b"\0" * 4, len(offsets))
+    return _atom(atom_type, table + struct.pack(fmt % len(offsets), *offsets))
+
+
+def _chunk_offsets(data):
+    """every chunk offset in the file's moov, stco tables first, then co64"""
+    atoms = mp4atoms.read_top_level_atoms(io.BytesIO(data), len(data))
+    moov = mp4atoms.find_atom(atoms, b"moov")
+    payload = data[moov["offset"] + moov["header_size"] : moov["offset"] + moov["size"]]
+    offsets = []
+
+    def collect(tree):
+        for atom in tree:
+            if "children" in atom:
+                collect(atom["children"])
+            elif atom["type"] in (b"stco", b"co64"):
+                count = struct.unpack_from(">I", atom["data"], 4)[0]
+                fmt = ">%dI" if atom["type"] == b"stco" else ">%dQ"
+                offsets.extend(struct.unpack_from(fmt % count, atom["data"], 8))
+
+    collect(mp4atoms.parse_atom_tree(payload))
+    return offsets
+
+
+def _slow_start_file(trailing_atom):
+    """ftyp|mdat|moov[|free], with one stco track and one co64 track"""
+    ftyp = _atom(b"ftyp", b"M4A \0\0\0\0M4A mp42")
+    mdat = _atom(b"mdat", random.Random(0).randbytes(1024))
+    trailing = _atom(b"free", random.Random(1).randbytes(64))
+    mdat_data = len(ftyp) + 8
+
+    def track(atom_type, chunk_offsets):
+        stbl = _atom(b"stbl", _chunk_offset_table(atom_type, chunk_offsets))
+        return _atom(b"trak", _atom(b"mdia", _atom(b"minf", stbl)))
+
+    def moov(last_offset):
+        return _atom(
+            b"moov",
+            _atom(b"mvhd", b"\0" * 20)
+            + track(b"stco", [mdat_data + n for n in (0, 100, 517)] + [last_offset])
+            + track(b"co64", [mdat_data + n for n in (3, 900)]),
+        )
+
+    if not trailing_atom:
+        return ftyp + mdat + moov(mdat_data + 700)
+    # a chunk stored after the moov only moves by however much the moov grows
+    moov_end = len(ftyp + mdat + moov(0))
+    return ftyp + mdat + moov(moov_end + 8 + 16) + trailing
+
+
+@pytest.mark.parametrize("trailing_atom", [False, True])
+def test_make_faststart_keeps_every_chunk_offset_pointing_at_its_bytes(
+    tmp_path, trailing_atom
+):
+    data = _slow_start_file(trailing_atom)
+    src = tmp_path / "episode.m4a"
+    src.write_bytes(data)
+    assert not audiofiles.is_faststart(str(src))
+
+    dst = tmp_path / "episode.faststart.m4a"
+    assert audiofiles.make_faststart(str(src), str(dst))
+    faststart = dst.read_bytes()
+
+    assert audiofiles.is_faststart(str(dst))
+    assert len(faststart) == len(data)
+    before = _chunk_offsets(data)
+    after = _chunk_offsets(faststart)
+    assert len(after) == len(before) == 6
+    for old, new in zip(before, after):
+        assert faststart[new : new + 16] == data[old : old + 16]
+    assert not audiofiles.make_faststart(str(dst), str(tmp_path / "again.m4a"))
+
+
+def test_files_without_moov_are_broken_not_faststart(tmp_path):
+    truncated = tmp_path / "truncated.m4a"
+    truncated.write_bytes(_atom(b"ftyp", b"M4A \0\0\0\0") + _atom(b"mdat", b"x" * 64))
+    with pytest.raises(ValueError):
+        audiofiles.is_faststart(str(truncated))
+    with pytest.raises(ValueError):
+        audiofiles.make_faststart(str(truncated), str(tmp_path / "out.m4a"))
+    assert audiofiles.faststart_directory(str(tmp_path), check_only=True) == (
+        [],
+        [str(truncated)],
+    )
+    with pytest.raises(SystemExit) as exit_info:
+        audiofiles.main(["faststart", str(tmp_path), "--check"])
+    assert exit_info.value.code == 1
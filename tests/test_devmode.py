@@ -0,0 +1,48 @@
+"""dev mode rebuilds only what a batch of file changes affects"""
+
+from pathlib import Path
+
+import pytest
+
+from radiorumblenyc import catalog
+from radiorumblenyc import devmode
+from radiorumblenyc import shows
+
+TEMPLATE_PATH = str(Path(__file__).parents[1] / "templates" / "index.html.tmpl")
+
+
+@pytest.fixture
+def builder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "public" / "images").mkdir(parents=True)
+    audio_dir = tmp_path / "audio" / "2024"
+    audio_dir.mkdir(parents=True)
+    for episode_number in [1, 2, 3]:
+        name = f"202401{episode_number:02d}-radio-rumble-episode-{episode_number}-house.m4a"
+        (audio_dir / name).write_bytes(b"\0" * 100)
+    show = shows._show_from_config(
+        "test",
+        {"output_dir": "public", "template": TEMPLATE_PATH, "cover_art": False},
+    )
+    builder = devmode.DevBuilder({"shows": [show]}, audio_dir="audio")
+    builder.build_all()
+    return builder
+
+
+def test_new_image_rematches_only_the_episodes_it_covers(builder, monkeypatch):
+    matched = []
+    match_image = catalog._match_image
+
+    def _match_image(key, image_relpaths, show):
+        matched.append(key)
+        return match_image(key, image_relpaths, show)
+
+    monkeypatch.setattr(catalog, "_match_image", _match_image)
+    image = Path("public/images/radio-rumble-ep-2-house.png")
+    image.write_bytes(b"artwork 2")
+    builder.apply({str(image)})
+
+    assert matched == ["audio/2024/20240102-radio-rumble-episode-2-house.m4a"]
+    images = [item["image"] for item in builder.builds["test"]["json_feed"]["items"]]
+    assert images[1].endswith("images/radio-rumble-ep-2-house.png")
+    assert images[0] is None and images[2] is None
@@ -0,0 +1,137 @@
+"""incremental builds must produce the same bytes as full rebuilds"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from radiorumblenyc import pipeline
+from radiorumblenyc import shows
+
+TEMPLATE_PATH = str(Path(__file__).parents[1] / "templates" / "index.html.tmpl")
+
+
+def _audio_path(episode_number, etag, size=1000):
+    return {
+        "path": f"audio/2024/202401{episode_number:02d}-radio-rumble-episode-{episode_number}-house.m4a",
+        "content_length": size,
+        "last_modified": datetime(2024, 1, episode_number, 12, tzinfo=timezone.utc),
+        "etag": etag,
+    }
+
+
+@pytest.fixture
+def show(tmp_path, monkeypatch):
+    # no .build/plays.json here, so no play counts
+    monkeypatch.chdir(tmp_path)
+    output_dir = tmp_path / "public"
+    (output_dir / "images").mkdir(parents=True)
+    for episode_number in [1, 2]:
+        image = output_dir / "images" / f"radio-rumble-ep-{episode_number}-house.png"
+        image.write_bytes(f"artwork {episode_number}".encode())
+    return shows._show_from_config(
+        "test",
+        {
+            "output_dir": str(output_dir),
+            "template": TEMPLATE_PATH,
+            "cover_art": False,
+        },
+    )
+
+
+@pytest.fixture
+def build(show, tmp_path):
+    catalog_path = str(tmp_path / "catalog.sqlite3")
+
+    def _build(audio_paths, full=False):
+        return pipeline.build_show(
+            show, audio_paths, full=full, catalog_path=catalog_path
+        )
+
+    return _build
+
+
+@pytest.fixture
+def rendered_items(monkeypatch):
+    """keys of the items actually rendered (not reused from the cache)"""
+    rendered = []
+    render_item = pipeline._render_item
+
+    def _render_item(audio_path, show):
+        rendered.append(audio_path["path"])
+        return render_item(audio_path, show)
+
+    monkeypatch.setattr(pipeline, "_render_item", _render_item)
+    return rendered
+
+
+def _published(build):
+    return pipeline.rendered_outputs(pipeline.published_build(build))
+
+
+def test_unchanged_rebuild_reuses_every_item(build, rendered_items):
+    audio_paths = [_audio_path(n, f"etag-{n}") for n in [1, 2, 3]]
+    first = build(audio_paths)
+    rendered_items.clear()
+
+    incremental = build(audio_paths)
+    assert rendered_items == []
+    full = build(audio_paths, full=True)
+
+    assert pipeline.rendered_outputs(incremental) == pipeline.rendered_outputs(full)
+    assert pipeline.rendered_outputs(incremental) == pipeline.rendered_outputs(first)
+    assert _published(incremental) == _published(full)
+
+
+def test_etag_change_rerenders_only_that_item(build, rendered_items):
+    audio_paths = [_audio_path(n, f"etag-{n}") for n in [1, 2, 3]]
+    build(audio_paths)
+    rendered_items.clear()
+
+    audio_paths[1] = _audio_path(2, "etag-2-reuploaded", size=2000)
+    incremental = build(audio_paths)
+    assert rendered_items == [audio_paths[1]["path"]]
+    full = build(audio_paths, full=True)
+
+    assert pipeline.rendered_outputs(incremental) == pipeline.rendered_outputs(full)
+    assert _published(incremental) == _published(full)
+    sizes = [
+        item["attachments"][0]["size_in_bytes"]
+        for item in incremental["json_feed"]["items"]
+    ]
+    assert sizes == [1000, 2000, 1000]
+
+
+def test_artwork_fingerprint_change(build, show):
+    audio_paths = [_audio_path(n, f"etag-{n}") for n in [1, 2, 3]]
+    before = build(audio_paths)
+
+    image = Path(show["output_dir"]) / "images" / "radio-rumble-ep-1-house.png"
+    image.write_bytes(b"new artwork")
+    incremental = build(audio_paths)
+    full = build(audio_paths, full=True)
+
+    relpath = "images/radio-rumble-ep-1-house.png"
+    assert incremental["assets"][relpath] != before["assets"][relpath]
+    assert _published(incremental) == _published(full)
+    assert (
+        incremental["assets"][relpath].encode() in _published(incremental)["feed.json"]
+    )
+    # what is written locally keeps the plain name, which exists on disk
+    assert pipeline.rendered_outputs(incremental) == pipeline.rendered_outputs(full)
+    assert relpath.encode() in (Path(show["output_dir"]) / "feed.json").read_bytes()
+
+
+def test_removed_artwork_is_unmatched(build, show):
+    audio_paths = [_audio_path(n, f"etag-{n}") for n in [1, 2, 3]]
+    before = build(audio_paths)
+    assert before["json_feed"]["items"][1]["image"].endswith(
+        "radio-rumble-ep-2-house.png"
+    )
+
+    (Path(show["output_dir"]) / "images" / "radio-rumble-ep-2-house.png").unlink()
+    incremental = build(audio_paths)
+    full = build(audio_paths, full=True)
+
+    assert incremental["json_feed"]["items"][1]["image"] is None
+    assert pipeline.rendered_outputs(incremental) == pipeline.rendered_outputs(full)
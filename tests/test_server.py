@@ -0,0 +1,27 @@
+"""the in-memory feed server's snapshot swaps"""
+
+from radiorumblenyc import server
+
+
+def _site(body, last_modified):
+    return {
+        "resources": {
+            "/feed.json": server._memory_resource("/feed.json", body, last_modified)
+        },
+        "assets": {},
+    }
+
+
+def test_swap_keeps_last_modified_of_unchanged_resources():
+    feed_server = server.FeedServer(_site(b'{"items": []}', 1000))
+    feed_server.swap(_site(b'{"items": []}', 2000))
+    resource = feed_server.site["resources"]["/feed.json"]
+    assert resource["last_modified"] == 1000
+    since = {"if-modified-since": "Thu, 01 Jan 1970 00:16:40 GMT"}
+    assert server._not_modified(since, None, resource["last_modified"])
+
+
+def test_swap_updates_last_modified_of_changed_resources():
+    feed_server = server.FeedServer(_site(b'{"items": []}', 1000))
+    feed_server.swap(_site(b'{"items": [1]}', 2000))
+    assert feed_server.site["resources"]["/feed.json"]["last_modified"] == 2000
@@ -0,0 +1,87 @@
+"""notify against a local stub hub"""
+
+import socket
+import threading
+
+import pytest
+
+from radiorumblenyc import websub
+
+FEED_URL = "https://radio.rumble.nyc/feed.xml"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(websub, "BACKOFF_SECONDS", 0)
+
+
+def _start(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def stub_hub():
+    hubs = []
+
+    def _stub_hub(status):
+        hub = _start(websub.StubHub(status=status))
+        hubs.append(hub)
+        return hub
+
+    yield _stub_hub
+    for hub in hubs:
+        hub.shutdown()
+        hub.server_close()
+
+
+def test_accepted_publish(stub_hub):
+    hub = stub_hub(204)
+    assert websub.notify([FEED_URL], [hub.url], [])
+    assert len(hub.received) == 1
+    assert hub.received[0]["method"] == "POST"
+    assert hub.received[0]["body"] == {"hub.mode": ["publish"], "hub.url": [FEED_URL]}
+
+
+def test_ping_url_gets_the_quoted_feed_url(stub_hub):
+    hub = stub_hub(200)
+    assert websub.notify([FEED_URL], [], [f"{hub.url}ping?url={{feed_url}}"])
+    assert hub.received[0]["method"] == "GET"
+    assert hub.received[0]["path"] == (
+        "/ping?url=https%3A%2F%2Fradio.rumble.nyc%2Ffeed.xml"
+    )
+
+
+def test_server_error_is_retried(stub_hub):
+    hub = stub_hub(500)
+    assert not websub.notify([FEED_URL], [hub.url], [])
+    assert len(hub.received) == websub.RETRIES
+
+
+def test_client_error_is_not_retried(stub_hub):
+    hub = stub_hub(404)
+    assert not websub.notify([FEED_URL], [hub.url], [])
+    assert len(hub.received) == 1
+
+
+def test_hub_closing_without_a_reply_is_retried():
+    listener = socket.create_server(("127.0.0.1", 0))
+    accepted = []
+
+    def _hang_up():
+        while len(accepted) < websub.RETRIES:
+            conn, _ = listener.accept()
+            accepted.append(conn)
+            conn.recv(65536)
+            conn.close()
+
+    thread = threading.Thread(target=_hang_up, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{listener.getsockname()[1]}/"
+    try:
+        assert not websub.notify([FEED_URL], [url], [])
+    finally:
+        thread.join(timeout=5)
+        listener.close()
+    assert len(accepted) == websub.RETRIES